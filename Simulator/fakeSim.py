@@ -0,0 +1,106 @@
+"""
+Stand-in for a simulator, used to measure YASA itself without licenses
+
+    fakeSim.py compile [options] -l compile.log    creates ./simv
+    simv [options] -l sim.log                      writes a synthetic sim.log
+
+The simulation is configured with plusargs, from build.cfg, group.cfg or the
+command line, or with the YASA_FAKE_<NAME> environment variables:
+
+    +fake_duration=SECONDS[:MAX]   run time, uniformly random between SECONDS and MAX
+    +fake_log_lines=N              number of UVM_INFO lines written to sim.log
+    +fake_error_rate=P             probability of a UVM_ERROR
+    +fake_warning_rate=P           probability of a UVM_WARNING
+    +fake_fatal_rate=P             probability of a UVM_FATAL, which ends the simulation
+
+Random choices are seeded with +ntb_random_seed so a test is reproducible.
+YASA_FAKE_COMPILE_DURATION sets the compile time in seconds.
+"""
+import os
+import sys
+import time
+import random
+import stat
+
+SIM_END = 'FAKE simulation finished'
+
+DEFAULTS = {'duration': '0',
+            'log_lines': '100',
+            'error_rate': '0',
+            'warning_rate': '0',
+            'fatal_rate': '0'}
+
+
+def parseArgs(argv):
+    """
+    Return the log file and the fake_* settings and seed found in argv
+    """
+    logFile = None
+    settings = dict((name, os.environ.get('YASA_FAKE_' + name.upper(), value))
+                    for (name, value) in DEFAULTS.items())
+    seed = 1
+    for (index, arg) in enumerate(argv):
+        if arg == '-l' and index + 1 < len(argv):
+            logFile = argv[index + 1]
+        elif arg.startswith('+fake_') and '=' in arg:
+            (name, value) = arg[len('+fake_'):].split('=', 1)
+            settings[name] = value
+        elif arg.startswith('+ntb_random_seed='):
+            seed = int(arg.split('=', 1)[1])
+    return logFile, settings, seed
+
+
+def compile(argv):
+    logFile, _, _ = parseArgs(argv)
+    time.sleep(float(os.environ.get('YASA_FAKE_COMPILE_DURATION', 0)))
+    with open(logFile or 'compile.log', 'w') as f:
+        f.write('fakeSim compile %s\n' % ' '.join(argv))
+    with open('simv', 'w') as f:
+        f.write('#!/bin/sh\nexec %s -S %s sim "$@"\n' % (sys.executable, os.path.abspath(__file__)))
+    os.chmod('simv', os.stat('simv').st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return 0
+
+
+def simulate(argv):
+    logFile, settings, seed = parseArgs(argv)
+    rand = random.Random(seed)
+    durations = [float(value) for value in settings['duration'].split(':')]
+    duration = rand.uniform(durations[0], durations[-1])
+    numLines = int(settings['log_lines'])
+    start = time.time()
+
+    with open(logFile or 'sim.log', 'w') as f:
+        f.write('fakeSim simulate %s\n' % ' '.join(argv))
+        # Spread the log lines over the run time
+        numChunks = 10 if duration > 0 else 1
+        for chunk in range(numChunks):
+            for line in range(chunk * numLines // numChunks, (chunk + 1) * numLines // numChunks):
+                f.write('UVM_INFO fake_test.sv(%i) @ %i: uvm_test_top [FAKE] synthetic log line %i\n'
+                        % (line, line * 10, line))
+            f.flush()
+            time.sleep(max(0.0, start + duration * (chunk + 1) / numChunks - time.time()))
+
+        counts = {'UVM_ERROR': 0, 'UVM_WARNING': 0, 'UVM_FATAL': 0}
+        if rand.random() < float(settings['warning_rate']):
+            f.write('UVM_WARNING fake_test.sv(1) @ %i: uvm_test_top [FAKE] synthetic warning\n' % numLines)
+            counts['UVM_WARNING'] += 1
+        if rand.random() < float(settings['error_rate']):
+            f.write('UVM_ERROR fake_test.sv(2) @ %i: uvm_test_top [FAKE] synthetic error\n' % numLines)
+            counts['UVM_ERROR'] += 1
+        if rand.random() < float(settings['fatal_rate']):
+            f.write('UVM_FATAL fake_test.sv(3) @ %i: uvm_test_top [FAKE] synthetic fatal\n' % numLines)
+            counts['UVM_FATAL'] += 1
+
+        f.write('--- UVM Report Summary ---\n')
+        for (severity, count) in sorted(counts.items()):
+            f.write('%s : %i\n' % (severity, count))
+        f.write('%s\n' % SIM_END)
+    print('fakeSim: %i lines written to %s' % (numLines, logFile or 'sim.log'))
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ('compile', 'sim'):
+        sys.stderr.write('usage: fakeSim.py compile|sim [options]\n')
+        sys.exit(2)
+    sys.exit(compile(sys.argv[2:]) if sys.argv[1] == 'compile' else simulate(sys.argv[2:]))
@@ -0,0 +1,78 @@
+"""
+Interface for a fake simulator, see fakeSim.py.
+It needs no license so YASA overhead can be measured, see yasaBench.py
+"""
+import os
+import re
+import sys
+import logging
+from utils import *
+from .simulatorInterface import (simulatorInterface, run_command)
+from .simCheck import *
+from .vcsInterface import testArgsAction, seedArgsAction
+from . import fakeSim
+
+LOGGER = logging.getLogger(__name__)
+
+class fakeSimInterface(simulatorInterface):
+    """
+    Interface for the fake simulator
+    """
+
+    name = "fake"
+
+    @staticmethod
+    def add_arguments(parser, group):
+        """
+        Add command line arguments
+        """
+        group.add_argument('-t', '-test', dest='test', action=testArgsAction, help='assign test name')
+
+        parser.add_argument('-cov', nargs='?', const='all', dest='cov',
+                            help='accepted for compatibility, the fake simulator collects no coverage')
+
+        parser.add_argument('-seed', type=positive_int, dest='seed', default=0, action=seedArgsAction,
+                            help='set testcase random seed')
+
+    @classmethod
+    def find_prefix_from_path(cls):
+        """
+        The fake simulator is part of YASA
+        """
+        return os.path.dirname(os.path.abspath(fakeSim.__file__))
+
+    def __init__(self):
+        simulatorInterface.__init__(self)
+        self._simCheck = fakeSimCheck()
+
+    @property
+    def simCheck(self):
+        return self._simCheck
+
+    def compileExe(self):
+        """
+        Returns fake compile executable cmd
+        """
+        return '%s -S %s compile' % (sys.executable, os.path.abspath(fakeSim.__file__))
+
+    def simExe(self):
+        """
+        Returns fake simv executable cmd, created by compiling
+        """
+        return 'simv'
+
+    def executeSimulataion(self, testWordDir, simCmd, timeout, output=None, monitor=None, usage=None):
+        if not run_command(simCmd, testWordDir, timeout, output, monitor, usage):
+            return False
+        else:
+            return True
+
+class fakeSimCheck(simCheck):
+    """
+    fake simulator specified simulation results checker
+    """
+    simEndPattern = r'^' + fakeSim.SIM_END
+
+    def __init__(self):
+        super(fakeSimCheck, self).__init__()
+        self._simEndPattern = re.compile(fakeSimCheck.simEndPattern)
@@ -119,8 +119,8 @@ class incisiveInterface(simulatorInterface):
         """
         pass
 
-    def executeSimulataion(self, testWordDir, simCmd, timeout):
-        if not run_command(simCmd, testWordDir, timeout):
+    def executeSimulataion(self, testWordDir, simCmd, timeout, output=None, monitor=None, usage=None):
+        if not run_command(simCmd, testWordDir, timeout, output, monitor, usage):
             return False
         else:
             return True
@@ -138,5 +138,5 @@ class irunSimCheck(simCheck):
         super(irunSimCheck, self).__init__()
         self._simEndPattern = re.compile(irunSimCheck.simEndPattern)        
         self.setErrPatterns(irunSimCheck.irunErrorPattern)    
-        self.setErrPatterns(irunSimCheck.coreDumpPattern)
+        self.setFatalPatterns(irunSimCheck.coreDumpPattern)
         self.setWarnPatterns(irunSimCheck.timingViolationPattern)        
@@ -1,6 +1,12 @@
 import re
+import copy
+import os
+import importlib.util
+import sys
+
 class simCheck(object):
     uvmErrorPattern = r'^.*UVM_((ERROR)|(FATAL)) .*\@.*:'
+    uvmFatalPattern = r'^.*UVM_FATAL .*\@.*:'
     uvmWarningPattern = r'^.*UVM_WARNING .*\@.*:'
     uvmReportPattern = r'^--- UVM Report Summary ---'
     errorTaskPattern = r'^Error.+:'
@@ -11,6 +17,8 @@ class simCheck(object):
         self._excludeErrPatterns = []
         self.setErrPatterns(simCheck.uvmErrorPattern)
         self.setErrPatterns(simCheck.errorTaskPattern)
+        # uvmErrorPattern already covers UVM_FATAL
+        self._fatalPatterns = [re.compile(simCheck.uvmFatalPattern)]
         self._warnPatterns = []
         self._excludeWarnPatterns = []
         self.setWarnPatterns(simCheck.uvmWarningPattern)
@@ -19,12 +27,38 @@ class simCheck(object):
         self._failStatus = ''
         self._reasonMsg = ''
         self._endFlagHit = False
+        self._fatalHit = False
+        self._simEndHit = False
+        self._matchers = None
         self._simEndPattern = None 
 
     def resetStatus(self):
         self._failStatus = ''
         self._reasonMsg = ''
         self._endFlagHit = False
+        self._fatalHit = False
+        self._simEndHit = False
+
+    def clone(self):
+        """
+        Return a checker with a fresh status sharing the compiled patterns
+        """
+        if self._matchers is None:
+            self._compileMatchers()
+        checker = copy.copy(self)
+        # Adding patterns to the clone must not change this checker
+        for name in ('_errPatterns', '_excludeErrPatterns', '_fatalPatterns', '_warnPatterns',
+                     '_excludeWarnPatterns', '_endFlagPatterns'):
+            setattr(checker, name, list(getattr(self, name)))
+        checker.resetStatus()
+        return checker
+
+    @property
+    def fatal(self):
+        """
+        True when a fatal error was seen, the simulation can be aborted
+        """
+        return self._fatalHit
 
     @property
     def status (self):
@@ -39,39 +73,162 @@ class simCheck(object):
 
     def setErrPatterns(self, pattern):
         self._errPatterns.append(re.compile(pattern))
+        self._matchers = None
+
+    def setFatalPatterns(self, pattern):
+        """
+        Fatal patterns are error patterns after which the simulation can be aborted
+        """
+        self._errPatterns.append(re.compile(pattern))
+        self._fatalPatterns.append(re.compile(pattern))
+        self._matchers = None
     
     def setWarnPatterns(self, pattern):
         self._warnPatterns.append(re.compile(pattern))
+        self._matchers = None
     
     def setExcludeErrPatterns(self, pattern):
         self._excludeErrPatterns.append(re.compile(pattern))
+        self._matchers = None
     
     def setExcludeWarnPatterns(self, pattern):
         self._excludeWarnPatterns.append(re.compile(pattern))
+        self._matchers = None
     
     def setEndFlagPatterns(self, pattern):
         self._endFlagPatterns.append(re.compile(pattern))
+        self._matchers = None
+
+    @property
+    def _simEndPattern(self):
+        return self._simEndRe
+
+    @_simEndPattern.setter
+    def _simEndPattern(self, pattern):
+        self._simEndRe = pattern
+        self._matchers = None
+
+    def _compileMatchers(self):
+        """
+        Combine the patterns of each kind into a single regex, plus one
+        regex of all patterns which rejects the vast majority of log lines
+        with a single match call
+        """
+        simEnd = [self._simEndRe] if self._simEndRe is not None else []
+        self._matchers = {
+            'any': _combine(self._errPatterns + self._warnPatterns + self._endFlagPatterns + simEnd),
+            'err': _combine(self._errPatterns),
+            'fatal': _combine(self._fatalPatterns),
+            'warn': _combine(self._warnPatterns),
+            'excludeErr': _combine(self._excludeErrPatterns),
+            'excludeWarn': _combine(self._excludeWarnPatterns),
+            'endFlag': _combine(self._endFlagPatterns),
+            'simEnd': _combine(simEnd),
+        }
 
     def check(self, string):
-        for errPattern in self._errPatterns:
-            if errPattern.match(string):
-                excluded = filter(lambda x: x.match(string), self._excludeErrPatterns)
-                if not list(excluded):
-                    if self._failStatus != 'FAIL':
-                        self._failStatus = 'FAIL'
-                        self._reasonMsg = string
-
-        for warnPattern in self._warnPatterns:
-            if warnPattern.match(string):
-                excluded = filter(lambda x:x.match(string), self._excludeWarnPatterns)
-                if not list(excluded):
-                    if not self._failStatus:
-                        self._failStatus = 'WARN'
-                        self._reasonMsg = string 
+        """
+        Check one log line, returns True once the simulation end pattern
+        has been seen. Lines after the end pattern are not checked anymore
+        """
+        if self._simEndHit:
+            return True
+        if self._matchers is None:
+            self._compileMatchers()
+        matchers = self._matchers
+
+        if not matchers['any'].match(string):
+            return
+
+        if matchers['err'].match(string) and not matchers['excludeErr'].match(string):
+            if self._failStatus != 'FAIL':
+                self._failStatus = 'FAIL'
+                self._reasonMsg = string
+            if not self._fatalHit:
+                self._fatalHit = bool(matchers['fatal'].match(string))
+
+        if matchers['warn'].match(string) and not matchers['excludeWarn'].match(string):
+            if not self._failStatus:
+                self._failStatus = 'WARN'
+                self._reasonMsg = string 
     
-        for endFlagPattern in self._endFlagPatterns:
-            if endFlagPattern.match(string) :
-                self._endFlagHit = True
+        if matchers['endFlag'].match(string):
+            self._endFlagHit = True
     
-        if self._simEndPattern.match(string):
+        if matchers['simEnd'].match(string):
+            self._simEndHit = True
             return True
+
+
+class simCheckFactory(object):
+    """
+    Create simulation results checkers for each test run. The user checker
+    plugin is loaded, validated and its patterns compiled once, each run
+    gets a cheap clone of that prototype
+    """
+    def __init__(self, default, userSimCheckFile=None):
+        if userSimCheckFile:
+            self._prototype = self._loadUserSimCheck(userSimCheckFile)
+        else:
+            self._prototype = default.clone()
+
+    @staticmethod
+    def _loadUserSimCheck(userSimCheckFile):
+        """
+        Import the userSimCheck class from userSimCheckFile, its directory
+        is added to sys.path once so it can import modules next to it
+        """
+        userDir = os.path.dirname(os.path.abspath(userSimCheckFile))
+        if userDir not in sys.path:
+            sys.path.insert(0, userDir)
+        spec = importlib.util.spec_from_file_location('userSimCheck', userSimCheckFile)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules['userSimCheck'] = module
+
+        userClass = getattr(module, 'userSimCheck', None)
+        if not (isinstance(userClass, type) and issubclass(userClass, simCheck)):
+            raise RuntimeError('%s must define class userSimCheck derived from simCheck' % userSimCheckFile)
+        return userClass()
+
+    def create(self):
+        return self._prototype.clone()
+
+
+# Backreferences refer to groups by number or name which is not stable
+# when a pattern becomes part of an alternation
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+class _anyOf(object):
+    """
+    Matches when any of the patterns matches, used when the patterns
+    can not be combined into a single regex
+    """
+    def __init__(self, patterns):
+        self._patterns = patterns
+
+    def match(self, string):
+        return any(pattern.match(string) for pattern in self._patterns)
+
+class _never(object):
+    """
+    Matcher for an empty pattern list
+    """
+    @staticmethod
+    def match(string):
+        return False
+
+def _combine(patterns):
+    """
+    Return a matcher which matches when any of the compiled patterns matches
+    """
+    if not patterns:
+        return _never()
+    if len(patterns) == 1:
+        return patterns[0]
+    if any(_BACKREFERENCE.search(x.pattern) or x.flags & ~re.UNICODE for x in patterns):
+        return _anyOf(patterns)
+    try:
+        return re.compile('|'.join('(?:%s)' % x.pattern for x in patterns))
+    except re.error:
+        return _anyOf(patterns)
@@ -6,6 +6,7 @@ import os
 from .vcsInterface import vcsInterface
 from .incisiveInterface import incisiveInterface
 from .xceliumInterface import xceliumInterface
+from .fakeSimInterface import fakeSimInterface
 #from .simulatorInterface import (BooleanOption, ListOfStringOption)
 
 class simulatorFactory(object):
@@ -22,6 +23,7 @@ class simulatorFactory(object):
         return [vcsInterface,
                 incisiveInterface,
                 xceliumInterface,
+                fakeSimInterface,
                 ]
 
     def select_simulator(self):
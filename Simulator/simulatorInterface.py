@@ -4,10 +4,12 @@ Generic simulator interface
 import sys
 import os
 import subprocess
-from ostools import Process, simplify_path
+import threading
+from ostools import Process, simplify_path, WATCHDOG
 from exceptions import CompileError
 from color_printer import NO_COLOR_PRINTER
-from threading import Timer
+from globals import userSimCheck
+from .simCheck import simCheckFactory
 
 class simulatorInterface(object):
     """
@@ -22,6 +24,9 @@ class simulatorInterface(object):
     def __init__(self):
         self._output_path = ''
         self.sim_timeout = 3600
+        self.abort_on_fatal = False
+        self._simCheckFactory = None
+        self._simCheckLock = threading.Lock()
 
     @property
     def output_path(self):
@@ -99,6 +104,23 @@ class simulatorInterface(object):
                 return path0
         return None
 
+    def loadSimCheck(self):
+        """
+        Load the user simulation checker plugin if there is one,
+        otherwise use the simulator specific checker
+        """
+        with self._simCheckLock:
+            if self._simCheckFactory is None:
+                (userSimCheckFunc, userSimCheckFile) = userSimCheck()
+                self._simCheckFactory = simCheckFactory(self.simCheck, userSimCheckFile)
+
+    def createSimCheck(self):
+        """
+        Return a new simulation results checker for one test run
+        """
+        self.loadSimCheck()
+        return self._simCheckFactory.create()
+
     def merge_coverage(self, file_name, args):  # pylint: disable=unused-argument, no-self-use
         """
         Hook for simulator interface to creating coverage reports
@@ -118,10 +140,21 @@ class simulatorInterface(object):
         self.add_simulator_specific()
         self.executeCompile(buildDir, cmd, printer, timeout)
 
-    def simulate(self, testWordDir, simCmd):
-        self.executeSimulataion(testWordDir,  simCmd, self.sim_timeout)
+    def simulate(self, testWordDir, simCmd, output=None, monitor=None, usage=None, timeout=None):
+        """
+        Simulate, output is the file receiving the simulator stdout/stderr,
+        None to consume it through a pipe.
+        monitor is called periodically while simulating, the simulation
+        is aborted when it returns something else than None.
+        usage is an optional dict receiving the peak memory, cpu time and
+        I/O of the simulation.
+        timeout overrides sim_timeout for this simulation
+        """
+        if timeout is None:
+            timeout = self.sim_timeout
+        return self.executeSimulataion(testWordDir,  simCmd, timeout, output, monitor, usage)
 
-    def executeSimulataion(self, testcaseDir, simCmd, timeout):
+    def executeSimulataion(self, testcaseDir, simCmd, timeout, output=None, monitor=None, usage=None):
         """
         Simulate
         """
@@ -161,46 +194,71 @@ def isfile(file_name):
 
     return os.path.basename(file_name) in os.listdir(os.path.dirname(file_name))
 
-def run_command(command, cwd=None, timeout=1800):
+def run_command(command, cwd=None, timeout=1800, output=None, monitor=None, usage=None):
     """
-    Run a command
+    Run a command, usage is an optional dict receiving the resources
+    used by the command once it has exited, and under 'timed_out'
+    whether the watchdog killed it
     """
+    proc = Process(command, cwd=cwd, output=output)
+    watch = WATCHDOG.watch(proc, timeout)
     try:
-        proc = Process(command, cwd=cwd)
-        t = Timer(timeout, lambda: kill(proc))
-        t.start()
-        proc.consume_output()
-        t.cancel() 
+        proc.consume_output(monitor=monitor)
+        _record_usage(proc, usage)
         return True
     except Process.NonZeroExitCode:
-        t.cancel()        
-        pass
+        _record_usage(proc, usage)
     except KeyboardInterrupt:
-        t.cancel()        
+        proc.terminate()
         raise
+    finally:
+        _end_watch(proc, watch, cwd, timeout)
+        if usage is not None:
+            usage['timed_out'] = watch.expired
     return False
 
+def _end_watch(proc, watch, cwd, timeout):
+    """
+    Stop watching proc. When the deadline passed the soft signal may only
+    have ended the shell, the watchdog kills the processes left in its
+    group at the end of the grace period
+    """
+    if watch.expired:
+        proc.wait_for_group(watch.grace + Process.KILL_TIMEOUT)
+    WATCHDOG.cancel(watch)
+    if watch.expired:
+        _report_timeout(cwd, timeout)
+
+def _record_usage(proc, usage):
+    """
+    Copy the resource usage of an exited process into usage
+    """
+    if usage is not None and proc.usage:
+        usage.update(proc.usage)
+
 def run_compile_command(command, cwd, timeout):
     """
     Run a command
     """
+    proc = Process(command, cwd=cwd)
+    watch = WATCHDOG.watch(proc, timeout)
     try:
-        proc = Process(command, cwd=cwd)
-        t = Timer(timeout, lambda: kill(proc))
-        t.start()
         proc.consume_output()
-        t.cancel()        
         return True
     except Process.NonZeroExitCode:
-        t.cancel()
         pass
     except KeyboardInterrupt:
         print()
         print("Caught Ctrl-C shutting down")
-        t.cancel()        
         proc.terminate()
+    finally:
+        _end_watch(proc, watch, cwd, timeout)
     return False
 
-def kill(proc):
-    print('Subprocess probably got killed by timeout!')
-    proc.terminate()
+def _report_timeout(cwd, timeout):
+    """
+    Tell that a command got killed by the watchdog, on the real stdout
+    since the stdout of test runner threads is usually discarded
+    """
+    sys.__stdout__.write('Subprocess in %s got killed by timeout after %i seconds!\n' % (cwd, timeout))
+    sys.__stdout__.flush()
@@ -126,8 +126,8 @@ class vcsInterface(simulatorInterface):
         return 'simv'
 
 
-    def executeSimulataion(self, testWordDir, simCmd, timeout):
-        if not run_command(simCmd, testWordDir, timeout):
+    def executeSimulataion(self, testWordDir, simCmd, timeout, output=None, monitor=None, usage=None):
+        if not run_command(simCmd, testWordDir, timeout, output, monitor, usage):
             return False
         else:
             return True
@@ -145,5 +145,5 @@ class vcsSimCheck(simCheck):
         super(vcsSimCheck, self).__init__()
         self._simEndPattern = re.compile(vcsSimCheck.simEndPattern)        
         self.setExcludeWarnPatterns(vcsSimCheck.vcsErrorPattern)
-        self.setErrPatterns(vcsSimCheck.coreDumpPattern)
+        self.setFatalPatterns(vcsSimCheck.coreDumpPattern)
         self.setWarnPatterns(vcsSimCheck.timingViolationPattern)
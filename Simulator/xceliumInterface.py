@@ -119,8 +119,8 @@ class xceliumInterface(simulatorInterface):
     #    """
     #    pass
 
-    def executeSimulataion(self, testWordDir, simCmd, timeout):
-        if not run_command(simCmd, testWordDir, timeout):
+    def executeSimulataion(self, testWordDir, simCmd, timeout, output=None, monitor=None, usage=None):
+        if not run_command(simCmd, testWordDir, timeout, output, monitor, usage):
             return False
         else:
             return True
@@ -138,5 +138,5 @@ class xrunSimCheck(simCheck):
         super(xrunSimCheck, self).__init__()
         self._simEndPattern = re.compile(xrunSimCheck.simEndPattern)        
         self.setErrPatterns(xrunSimCheck.xrunErrorPattern)    
-        self.setErrPatterns(xrunSimCheck.coreDumpPattern)
+        self.setFatalPatterns(xrunSimCheck.coreDumpPattern)
         self.setWarnPatterns(xrunSimCheck.timingViolationPattern)        
@@ -0,0 +1,99 @@
+#******************************************************************************
+# * Copyright (c) 2019, XtremeDV. All rights reserved.
+# *
+# * Licensed under the Apache License, Version 2.0 (the "License");
+# * you may not use this file except in compliance with the License.
+# * You may obtain a copy of the License at
+# *
+# * http://www.apache.org/licenses/LICENSE-2.0
+# *
+# * Unless required by applicable law or agreed to in writing, software
+# * distributed under the License is distributed on an "AS IS" BASIS,
+# * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# * See the License for the specific language governing permissions and
+# * limitations under the License.
+# *
+# * Author: Jude Zhang, Email: zhajio.1988@gmail.com
+# *******************************************************************************
+"""
+Admission control of tests run in parallel on the local host
+"""
+
+import os
+import time
+import threading
+import logging
+import psutil
+import ostools
+
+LOGGER = logging.getLogger(__name__)
+
+# Memory in MB kept free for the rest of the host
+RESERVED_MB = 1024
+# Seconds after starting a test during which its memory is still counted
+# as reserved, a simulation allocates its memory while elaborating so the
+# free memory of the host does not show it yet
+RAMP_TIME = 60.0
+# Seconds between two checks of the host while a test is waiting
+POLL_INTERVAL = 1.0
+
+
+class AdmissionControl(object):
+    """
+    Delay starting a test until the host has enough free memory for it and
+    is not overloaded, instead of starting -p tests no matter what.
+
+    expected_memory returns the expected peak memory in MB of a test suite
+    or None when unknown, unknown tests only wait for the load. A test is
+    always started when no other test is running, so a test larger than
+    the host still runs, alone
+    """
+    def __init__(self, expected_memory, max_load=1.0,
+                 reserved_mb=RESERVED_MB, ramp_time=RAMP_TIME, poll_interval=POLL_INTERVAL):
+        self._expected_memory = expected_memory
+        self._max_load = max_load
+        self._reserved_mb = reserved_mb
+        self._ramp_time = ramp_time
+        self._poll_interval = poll_interval
+        self._condition = threading.Condition()
+        # Expected memory and start time of the running tests by name
+        self._running = {}
+        self._num_cpus = psutil.cpu_count() or 1
+        ostools.PROGRAM_STATUS.register(self._condition)
+
+    def acquire(self, test_suite):
+        """
+        Block until test_suite may start
+        """
+        memory = self._expected_memory(test_suite) or 0
+        waiting = False
+        with self._condition:
+            while self._running and not self._fits(memory):
+                if not waiting:
+                    LOGGER.debug("AdmissionControl: %s waits for %.0f MB", test_suite.name, memory)
+                    waiting = True
+                # Woken up early when another test ends
+                self._condition.wait(self._poll_interval)
+                ostools.PROGRAM_STATUS.check_for_shutdown()
+            self._running[test_suite.name] = (memory, time.time())
+
+    def release(self, test_suite):
+        """
+        Signal that test_suite has ended
+        """
+        with self._condition:
+            self._running.pop(test_suite.name, None)
+            self._condition.notify_all()
+
+    def _fits(self, memory):
+        """
+        Return True when a test using memory MB fits the host now
+        """
+        if psutil.getloadavg()[0] / self._num_cpus > self._max_load:
+            return False
+
+        now = time.time()
+        ramping = sum(expected for expected, start in self._running.values()
+                      if now - start < self._ramp_time)
+        available = psutil.virtual_memory().available / (1024.0 * 1024)
+        return available - ramping - self._reserved_mb >= memory
@@ -0,0 +1,205 @@
+#******************************************************************************
+# * Copyright (c) 2019, XtremeDV. All rights reserved.
+# *
+# * Licensed under the Apache License, Version 2.0 (the "License");
+# * you may not use this file except in compliance with the License.
+# * You may obtain a copy of the License at
+# *
+# * http://www.apache.org/licenses/LICENSE-2.0
+# *
+# * Unless required by applicable law or agreed to in writing, software
+# * distributed under the License is distributed on an "AS IS" BASIS,
+# * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# * See the License for the specific language governing permissions and
+# * limitations under the License.
+# *
+# * Author: Jude Zhang, Email: zhajio.1988@gmail.com
+# *******************************************************************************
+"""
+Build cache shared between workspaces and users
+"""
+
+import os
+import time
+import errno
+import shutil
+import stat
+import logging
+from buildFingerprint import BUILD_SCRIPTS, FINGERPRINT_FILE
+from tracing import PHASE_FILE
+
+LOGGER = logging.getLogger(__name__)
+
+# Marks a build dir populated from the cache, its files are shared with the cache
+CACHED_MARKER = '.yasa_build_cache'
+# Files in the build dir that are not build outputs
+NOT_CACHED = BUILD_SCRIPTS + (FINGERPRINT_FILE, CACHED_MARKER, PHASE_FILE, 'test_status.hud')
+
+
+class buildCache(object):
+    """
+    Content addressed store of compiled build dirs.
+
+    An entry is a copy of a build dir named by the content key of the build
+    inputs, see buildFingerprint.contentKey. Entries are published by
+    renaming a complete copy into place, so other users never see partial
+    entries, and are fetched by hard linking their files into the build dir.
+    Cached files are read-only since they are shared by every build dir
+    fetched from the entry. The modification time of an entry records its
+    last use, entries older than maxAge days are evicted first, then the
+    least recently used until the cache is below maxSize GB
+    """
+    def __init__(self, cacheDir, maxSize=50.0, maxAge=14.0):
+        self._cacheDir = cacheDir
+        self._maxSize = int(maxSize * 1024 ** 3)
+        self._maxAge = maxAge * 24 * 3600
+        if not os.path.exists(cacheDir):
+            os.makedirs(cacheDir, exist_ok=True)
+
+    def _entryDir(self, key):
+        return os.path.join(self._cacheDir, key)
+
+    def fetch(self, key, buildDir):
+        """
+        Populate buildDir from the entry of key, return False on a cache miss.
+        The generated build scripts in buildDir are kept
+        """
+        entryDir = self._entryDir(key)
+        if not os.path.isdir(entryDir):
+            return False
+
+        # Marked before linking, a fetch interrupted halfway is cleaned by
+        # the next compile like any build dir shared with the cache
+        marker = os.path.join(buildDir, CACHED_MARKER)
+        with open(marker, 'w') as f:
+            f.write(key + '\n')
+        linked = []
+        try:
+            for (src, dst) in self._files(entryDir, buildDir):
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                _link(src, dst)
+                linked.append(dst)
+            os.utime(entryDir)
+        except OSError as err:
+            # Evicted while fetching, the compiler must not write into the shared files
+            LOGGER.debug("buildCache: fetching %s failed: %s", key, err)
+            for dst in linked + [marker]:
+                try:
+                    os.remove(dst)
+                except OSError:
+                    pass
+            return False
+        return True
+
+    def publish(self, key, buildDir):
+        """
+        Store buildDir as the entry of key unless it already exists
+        """
+        entryDir = self._entryDir(key)
+        if os.path.isdir(entryDir):
+            return
+
+        tempDir = os.path.join(self._cacheDir, '.tmp.%s.%i' % (key, os.getpid()))
+        try:
+            for (src, dst) in self._files(buildDir, tempDir):
+                shutil.copy2(src, dst, follow_symlinks=False)
+                if not os.path.islink(dst):
+                    os.chmod(dst, os.stat(dst).st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+            os.rename(tempDir, entryDir)
+        except OSError as err:
+            # Another process published the same key first or the cache is full
+            if err.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                LOGGER.warning("buildCache: publishing %s failed: %s", key, err)
+        finally:
+            if os.path.exists(tempDir):
+                _rmtree(tempDir)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Remove entries that are too old, then the least recently used ones
+        until the cache fits in its maximum size
+        """
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self._cacheDir):
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, _treeSize(entry.path), entry.path))
+            except OSError:
+                continue
+
+        entries.sort()
+        totalSize = sum(size for (_, size, _) in entries)
+        for (lastUsed, size, path) in entries:
+            if now - lastUsed <= self._maxAge and totalSize <= self._maxSize:
+                break
+            # Rename first so that nobody fetches a partially removed entry
+            removed = os.path.join(self._cacheDir, '.evicted.%s.%i' % (os.path.basename(path), os.getpid()))
+            try:
+                os.rename(path, removed)
+            except OSError:
+                continue
+            _rmtree(removed)
+            totalSize -= size
+
+    @staticmethod
+    def _files(fromDir, toDir):
+        """
+        Return (source, destination) pairs of the build outputs in fromDir,
+        creating the directories in toDir
+        """
+        skip = set(NOT_CACHED)
+        for (dirpath, dirnames, filenames) in os.walk(fromDir):
+            relDir = os.path.relpath(dirpath, fromDir)
+            outDir = os.path.normpath(os.path.join(toDir, relDir))
+            if not os.path.isdir(outDir):
+                os.makedirs(outDir)
+            for dirname in dirnames:
+                if os.path.islink(os.path.join(dirpath, dirname)):
+                    filenames.append(dirname)
+            for filename in filenames:
+                if relDir == '.' and filename in skip:
+                    continue
+                yield (os.path.join(dirpath, filename), os.path.join(outDir, filename))
+
+
+def isCachedBuild(buildDir):
+    """
+    Return True when the files of buildDir are shared with the build cache
+    """
+    return os.path.exists(os.path.join(buildDir, CACHED_MARKER))
+
+
+def _link(src, dst):
+    """
+    Hard link src to dst, copy when linking is not possible
+    """
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+        return
+    try:
+        os.link(src, dst)
+    except OSError as err:
+        if err.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        shutil.copy2(src, dst)
+
+
+def _treeSize(path):
+    size = 0
+    for (dirpath, _, filenames) in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def _rmtree(path):
+    # Files are read-only but removing them only needs a writable directory
+    shutil.rmtree(path, ignore_errors=True)
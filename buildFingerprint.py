@@ -0,0 +1,226 @@
+#******************************************************************************
+# * Copyright (c) 2019, XtremeDV. All rights reserved.
+# *
+# * Licensed under the Apache License, Version 2.0 (the "License");
+# * you may not use this file except in compliance with the License.
+# * You may obtain a copy of the License at
+# *
+# * http://www.apache.org/licenses/LICENSE-2.0
+# *
+# * Unless required by applicable law or agreed to in writing, software
+# * distributed under the License is distributed on an "AS IS" BASIS,
+# * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# * See the License for the specific language governing permissions and
+# * limitations under the License.
+# *
+# * Author: Jude Zhang, Email: zhajio.1988@gmail.com
+# *******************************************************************************
+"""
+Fingerprint of everything a build depends on, used to skip compiling
+when nothing changed since the last successful build
+"""
+
+import os
+import shlex
+import shutil
+import hashlib
+from globals import defaultTestListFile
+from hashing import FileHasher
+
+FINGERPRINT_FILE = '.yasa_fingerprint'
+BUILD_SCRIPTS = ('pre_compile.csh', 'compile.csh', 'post_compile.csh', defaultTestListFile())
+
+
+class buildFingerprint(object):
+    """
+    The fingerprint covers the generated compile scripts, the compile command,
+    the resolved simulator executable, the filelists referenced with -f and
+    the size and modification time of the sources and include directories
+    they reference
+    """
+    def __init__(self, buildDir, compileCmd):
+        self._buildDir = buildDir
+        self._compileCmd = compileCmd
+        self._digest = None
+
+    @property
+    def _fileName(self):
+        return os.path.join(self._buildDir, FINGERPRINT_FILE)
+
+    @property
+    def digest(self):
+        """
+        The fingerprint, computed once so that it describes the
+        sources as they were before compiling
+        """
+        if self._digest is None:
+            self._digest = self._compute()
+        return self._digest
+
+    def matches(self):
+        """
+        Return True when the last successful build had the same fingerprint
+        """
+        try:
+            with open(self._fileName, 'r') as f:
+                return f.read().strip() == self.digest
+        except (IOError, OSError):
+            return False
+
+    def save(self):
+        """
+        Save the fingerprint after a successful build
+        """
+        tempFile = self._fileName + '.tmp'
+        with open(tempFile, 'w') as f:
+            f.write(self.digest + '\n')
+        os.replace(tempFile, self._fileName)
+
+    def contentKey(self, prjHome, hasher=None):
+        """
+        Key of the build in a shared build cache. Unlike the fingerprint it
+        only depends on file contents, and the build dir and paths below
+        prjHome are made relative, so that the same sources checked out in
+        another workspace get the same key.
+        hasher is the FileHasher used to hash the sources
+        """
+        prjHome = os.path.join(os.path.normpath(prjHome), '')
+        buildDir = os.path.join(self._buildDir, '')
+
+        def normalize(text):
+            return text.replace(buildDir, '${BUILD_DIR}/').replace(prjHome, '${PRJ_HOME}/')
+
+        sha = hashlib.sha1()
+        sha.update(normalize(self._compileCmd).encode('utf-8'))
+        for script in BUILD_SCRIPTS:
+            content = _readBytes(os.path.join(self._buildDir, script)).decode('utf-8', 'surrogateescape')
+            sha.update(('\n#script %s\n%s' % (script, normalize(content))).encode('utf-8', 'surrogateescape'))
+            if script == 'compile.csh':
+                sha.update(('\n#simulator %s' % _simulatorPath(content)).encode('utf-8', 'surrogateescape'))
+
+        digests = (hasher or FileHasher()).hash_files(self._files())
+        for path in sorted(digests):
+            sha.update(('\n%s %s' % (normalize(path), digests[path] or 'missing')).encode('utf-8', 'surrogateescape'))
+        return sha.hexdigest()
+
+    def _compute(self):
+        sha = hashlib.sha1()
+        sha.update(self._compileCmd.encode('utf-8'))
+        for script in BUILD_SCRIPTS:
+            sha.update(('\n#script %s\n' % script).encode('utf-8'))
+            content = _readBytes(os.path.join(self._buildDir, script))
+            sha.update(content)
+            if script == 'compile.csh':
+                # A simulator switched in $PATH or installed over the old one
+                simulator = _simulatorPath(content.decode('utf-8', 'surrogateescape'))
+                sha.update(('\n#simulator %s %s' % (simulator, _statKey(simulator))).encode('utf-8', 'surrogateescape'))
+
+        for path in self._files():
+            sha.update(('\n%s %s' % (path, _statKey(path))).encode('utf-8', 'surrogateescape'))
+        return sha.hexdigest()
+
+    def _files(self):
+        """
+        Return the sorted source files of the build,
+        directories are expanded to the files they contain
+        """
+        files = set()
+        for path in self._dependencies():
+            if os.path.isdir(path):
+                try:
+                    files.update(entry.path for entry in os.scandir(path) if entry.is_file())
+                except OSError:
+                    pass
+            else:
+                files.add(path)
+        return sorted(files)
+
+    def _dependencies(self):
+        """
+        Return the files and directories referenced by the compile
+        script and test filelist. Nested filelists are expanded, paths in
+        -f filelists are relative to the build dir, paths in -F filelists
+        relative to the filelist. -v library files, -y library directories
+        and +incdir+ directories are included
+        """
+        dependencies = set()
+        # The generated scripts are rewritten on every run, only their content counts
+        filelists = [(os.path.join(self._buildDir, 'compile.csh'), self._buildDir),
+                     (os.path.join(self._buildDir, defaultTestListFile()), self._buildDir)]
+        visited = set(filelist for (filelist, _) in filelists)
+        while filelists:
+            (filelist, baseDir) = filelists.pop()
+
+            tokens = _tokens(filelist)
+            for index, token in enumerate(tokens):
+                argument = tokens[index + 1] if index + 1 < len(tokens) else None
+                if token in ('-f', '-F') and argument is not None:
+                    nested = self._path(argument, baseDir)
+                    if nested not in visited:
+                        visited.add(nested)
+                        dependencies.add(nested)
+                        filelists.append((nested, self._buildDir if token == '-f' else os.path.dirname(nested)))
+                elif token in ('-v', '-y') and argument is not None:
+                    dependencies.add(self._path(argument, baseDir))
+                elif token.startswith('+incdir+'):
+                    for incdir in token[len('+incdir+'):].split('+'):
+                        if incdir:
+                            dependencies.add(self._path(incdir, baseDir))
+                elif not token.startswith(('-', '+')):
+                    path = self._path(token, baseDir)
+                    # Files in the build dir like compile.log are outputs
+                    if os.path.isfile(path) and not path.startswith(os.path.join(self._buildDir, '')):
+                        dependencies.add(path)
+        return dependencies
+
+    @staticmethod
+    def _path(token, baseDir):
+        return os.path.normpath(os.path.join(baseDir, os.path.expandvars(token)))
+
+
+def _readBytes(fileName):
+    try:
+        with open(fileName, 'rb') as f:
+            return f.read()
+    except (IOError, OSError):
+        return b'missing'
+
+
+def _statKey(path):
+    """
+    Size and modification time of a file
+    """
+    try:
+        stat = os.stat(path)
+        return '%i:%i' % (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return 'missing'
+
+
+def _simulatorPath(compileCsh):
+    """
+    Resolved path of the compile executable, the first command in compile.csh
+    """
+    for line in compileCsh.splitlines():
+        words = line.split()
+        if words and not line.startswith('#'):
+            path = shutil.which(words[0])
+            return os.path.realpath(path) if path else words[0]
+    return ''
+
+
+def _tokens(fileName):
+    """
+    Split a shell script or filelist into words, dropping comments
+    """
+    lines = []
+    try:
+        with open(fileName, 'r', errors='ignore') as f:
+            for line in f:
+                lines.append(line.split('//', 1)[0])
+    except (IOError, OSError):
+        return []
+    try:
+        return shlex.split(''.join(lines).replace('\\\n', ' '), comments=True)
+    except ValueError:
+        return ''.join(lines).split()
@@ -25,6 +25,11 @@ from yasaCli import yasaCli
 from random import randint
 from exceptions import TestcaseUnknown
 from color_printer import COLOR_PRINTER
+from buildFingerprint import buildFingerprint
+from buildCache import isCachedBuild
+from hashing import FileHasher
+from tracing import TRACER, phase_markers
+from groupCfg import splitAnnotations
 
 class compileBuildBase(object):
     def __init__(self, cli=None, ini_file=None, simulator_if=None):
@@ -44,19 +49,31 @@ class compileBuildBase(object):
             self.buildCfg = readBuildCfgFile(defaultBuildFile())
         self._testList = tbInfo.testList()
         self._testcasesDir = []
+        # group.cfg annotations of each testcase dir, such as mem=20G
+        self._testAnnotations = {}
         self._seeds = []
+        self._fingerprint = None
+        self.upToDate = False
 
     def prepareEnv(self):
         """
-        Prepare build dir and testcase dirs
+        Prepare build dir and testcase dirs.
+        upToDate is set when the build fingerprint matches the
+        last successful build, then the build dir is kept as is
         """
         self.createRootWorkDir()
         if not self._args.simOnly:
             self.createBuildDir()
-            self.createCompileCsh()
+            with TRACER.span('create compile csh'):
+                self.createCompileCsh()
+            self._fingerprint = buildFingerprint(self._buildDir, self.compileCmd(trace=False))
+            self.upToDate = not self._args.clean and self._fingerprint.matches()
+            if not self.upToDate:
+                self.cleanBuildDir()
         if not self._args.compOnly:
             self.createCaseDir()
-            self.genTestscaseSimCsh()
+            with TRACER.span('create sim csh'):
+                self.genTestscaseSimCsh()
 
     def createRootWorkDir(self):
         createDir(defaultWorkDir())
@@ -64,6 +81,33 @@ class compileBuildBase(object):
     def createBuildDir(self):
         createDir(self._buildDir, self._args.clean)
 
+    def cleanBuildDir(self):
+        """
+        Called before compiling when the build is not up to date.
+        Files fetched from the build cache are shared with the cache,
+        the compiler must not overwrite them
+        """
+        if isCachedBuild(self._buildDir):
+            createDir(self._buildDir, True)
+            self.createCompileCsh()
+
+    def buildKey(self):
+        """
+        Key of the build in the build cache, file digests are
+        cached in the work dir so unchanged sources are not read again
+        """
+        hasher = FileHasher(cache_file=os.path.join(defaultWorkDir(), 'file_hashes.pickle'))
+        key = self._fingerprint.contentKey(os.environ['PRJ_HOME'], hasher)
+        hasher.save()
+        return key
+
+    def saveFingerprint(self):
+        """
+        Record the build fingerprint after a successful compile
+        """
+        if self._fingerprint is not None:
+            self._fingerprint.save()
+
     def createCaseDir(self):
         if self._args.unique_sim:
             createDir(self._testcaseRootDir, self._args.clean)
@@ -88,6 +132,14 @@ class compileBuildBase(object):
         """
         return self._testcasesDir    
 
+    @property
+    def testAnnotations(self):
+        """
+        group.cfg annotations of each testcase work dir,
+        dirs without annotations are not included
+        """
+        return self._testAnnotations
+
     def _check(self):
         """
         testcases work dir list, uesd in yasaTop, 
@@ -153,22 +205,28 @@ class compileBuildBase(object):
             cshContent  = cshContent + self._args.compileOption
         return cshContent + ['-f %s' % defaultTestListFile()] + ['-l compile.log']
 
-    def compileCmd(self):
+    def compileCmd(self, trace=True):
         """
         compilation command is a string of shell command, run in a python subprocess.
         when enable lsf subparser, insert lsf cmds at the top of shell command.
+        when tracing, the command records when each compile phase starts
         """        
-        compileCmd = 'set -e; chmod a+x pre_compile.csh compile.csh post_compile.csh; ./pre_compile.csh %s; ./compile.csh; ./post_compile.csh;' % self._args.test
+        compileCmd = 'set -e; chmod a+x pre_compile.csh compile.csh post_compile.csh; ' + phase_markers(
+            [('pre_compile', './pre_compile.csh %s' % self._args.test),
+             ('compile', './compile.csh'),
+             ('post_compile', './post_compile.csh')], trace)
         if self._args.subparsers == 'lsf':
             lsfOptions = self._args.lsfOptions
             return "bsub -Is "  + " ".join(lsfOptions) + '"%s"' % compileCmd 
         else:
             return compileCmd
 
-    def createSimCsh(self, testcaseDir, seed, isGroup):
+    def createSimCsh(self, testcaseDir, seed):
         """
         simulation cshell file content, can be from build.cfg file, userCli 
-        and argparse namespace
+        and argparse namespace.
+        simulator stdout/stderr is not redirected here, test runner decides
+        where it goes, see -sim_output
         """        
         with open(os.path.join(testcaseDir, 'pre_sim.csh'), 'w') as f:
             for item in self.buildCfg.preSimOption(self._args.build):
@@ -191,16 +249,13 @@ class compileBuildBase(object):
                     if self._simulator_if.name == 'irun':
                             f.write('\t' + '-f ' + os.path.join(self._buildDir, 'test.f') + ' \\' + '\n')
                     if self._args.seed == 0: 
-                        if self._simulator_if.name == 'vcs':
+                        if self._simulator_if.name in ['vcs', 'fake']:
                             f.write('\t' + '+ntb_random_seed=%s' % seed + ' \\' + '\n')
                         elif self._simulator_if.name in ['irun', 'xrun' ]:
                             f.write('\t' + '-svseed %s' % seed + ' \\' + '\n')
                     if self._args.cov and self._simulator_if.name == 'vcs':
                         f.write('\t' + '-cm_name %s' % self._args.test + '__' + str(seed) + ' -cm_dir ' + os.path.join(self._buildDir, defaultCovDir()) + ' \\' + '\n')
-                    if isGroup:
-                        f.write('\t' + item + ' >& /dev/null\n')                        
-                    else:
-                        f.write('\t' + item + '\n')
+                    f.write('\t' + item + '\n')
                 else:
                     f.write('\t' + item + ' \\' + '\n')
         with open(os.path.join(testcaseDir, 'post_sim.csh'), 'w') as f:
@@ -217,8 +272,11 @@ class compileBuildBase(object):
         return simContent + ['-l sim.log']
 
     def simCmd(self):
-        simCmd = 'set -e; chmod a+x pre_sim.csh sim.csh post_sim.csh; ./pre_sim.csh %s; ./sim.csh; ./post_sim.csh;' % self._args.test
-        if self._args.subparsers == 'lsf':
+        simCmd = 'set -e; chmod a+x pre_sim.csh sim.csh post_sim.csh; ' + phase_markers(
+            [('pre_sim', './pre_sim.csh %s' % self._args.test),
+             ('sim', './sim.csh'),
+             ('post_sim', './post_sim.csh')])
+        if self._args.subparsers == 'lsf' and not self._args.lsfBatch:
             lsfOptions = self._args.lsfOptions
             return "bsub -Is "  + " ".join(lsfOptions) + '"%s"' % simCmd 
         else:
@@ -291,10 +349,7 @@ class singleTestCompile(compileBuildBase):
             dir = os.path.join(self._testcaseRootDir, self._args.test + '__' + str(i))
             self._testcasesDir.append(dir)
             createDir(dir)
-            if len(self._seeds) >= 2:
-                self.createSimCsh(dir, i, 1)
-            else:
-                self.createSimCsh(dir, i, 0)
+            self.createSimCsh(dir, i)
 
 class groupTestCompile(compileBuildBase):
     def __init__(self, cli=None, group_file='', build_file='', simulator_if=None):
@@ -319,7 +374,14 @@ class groupTestCompile(compileBuildBase):
         self.setTestlist()
         
     def createBuildDir(self):
+        createDir(self._buildDir, self._args.clean)
+
+    def cleanBuildDir(self):
+        """
+        A group is compiled in an empty build dir
+        """
         createDir(self._buildDir, True)
+        self.createCompileCsh()
         
     @property
     def _buildDir(self):
@@ -364,15 +426,22 @@ class groupTestCompile(compileBuildBase):
         for k, v in self._testcases.items():
             for testAndOptions in v:
                 testAndOptions = '-b %s '%(self.groupCfg.validBuild) + '-t ' + testAndOptions
-                self._cli.parseArgs(argv=[x for x in testAndOptions.split(' ') if x !=''] + self._getSysArgv())
+                try:
+                    argv, annotations = splitAnnotations([x for x in testAndOptions.split(' ') if x !=''])
+                except ValueError as err:
+                    COLOR_PRINTER.write('group: %s\n' % err, fg='ri')
+                    sys.exit(1)
+                self._cli.parseArgs(argv=argv + self._getSysArgv())
                 self._args = self._cli.getParsedArgs()
                 self._check()
                 self.generateSeed()
                 for i in self._seeds:
                     dir = os.path.join(self._groupRootDir, k + '__' + self._args.test + '__' + str(i))
                     self._testcasesDir.append(dir)
+                    if annotations:
+                        self._testAnnotations[dir] = annotations
                     createDir(dir)
-                    self.createSimCsh(dir, i, 1)
+                    self.createSimCsh(dir, i)
 
 #if __name__ == '__main__':
 #    import sys
@@ -18,14 +18,19 @@
 # Copyright (c) 2014-2018, Lars Asplund lars.anders.asplund@gmail.com
 
 """
-A simple file based database
+Simple file based databases
 """
 
-from os.path import join, exists
+from os.path import join, exists, dirname
 import os
 import pickle
 import io
 import struct
+import sqlite3
+import threading
+import hashlib
+import fcntl
+from contextlib import contextmanager
 from ostools import renew_path
 
 
@@ -39,7 +44,10 @@ class DataBase(object):
     unsigned integer followed by the key followed by the data.
 
     The reason to not just have the keys as the file names is that
-    many operating systems does not support very long file names thus limiting the key length
+    many operating systems does not support very long file names thus limiting the key length.
+    Nodes are named by the hash of the key instead so several processes can
+    share the database without agreeing on node indexes. Nodes are written to
+    a temporary file and renamed into place, readers only see complete nodes
     """
 
     def __init__(self, path, new=False):
@@ -53,25 +61,7 @@ class DataBase(object):
         if new:
             renew_path(path)
         elif not exists(path):
-            os.makedirs(path)
-
-        # Map keys to nodes indexes
-        self._keys_to_nodes = self._discover_nodes()
-        if not self._keys_to_nodes:
-            self._next_node = 0
-        else:
-            self._next_node = max(self._keys_to_nodes.values()) + 1
-
-    def _discover_nodes(self):
-        """
-        Discover nodes already found in the database
-        """
-        keys_to_nodes = {}
-        for file_base_name in os.listdir(self._path):
-            key = self._read_key(join(self._path, file_base_name))
-            assert key not in keys_to_nodes  # Two nodes contains the same key
-            keys_to_nodes[key] = int(file_base_name)
-        return keys_to_nodes
+            os.makedirs(path, exist_ok=True)
 
     @staticmethod
     def _read_key_from_fptr(fptr):
@@ -83,59 +73,155 @@ class DataBase(object):
         key = fptr.read(key_size)
         return key
 
-    def _read_key(self, file_name):
+    def _read_node(self, file_name, key):
         """
-        Read key found in file_name
+        Read the data of key found in file_name, None if there is no such node
         """
-        with io.open(file_name, "rb") as fptr:
-            return self._read_key_from_fptr(fptr)
-
-    def _read_data(self, file_name):
-        """
-        Read key found in file_name
-        """
-        with io.open(file_name, "rb") as fptr:
-            self._read_key_from_fptr(fptr)
-            data = fptr.read()
-        return data
+        try:
+            with io.open(file_name, "rb") as fptr:
+                if self._read_key_from_fptr(fptr) != key:
+                    return None
+                return fptr.read()
+        except (IOError, OSError):
+            return None
 
     @staticmethod
     def _write_node(file_name, key, value):
         """
         Write node to file
         """
-        with io.open(file_name, "wb") as fptr:
-            fptr.write(struct.pack("I", len(key)))
-            fptr.write(key)
-            fptr.write(value)
+        temp_file_name = "%s.%i.%i.tmp" % (file_name, os.getpid(), threading.get_ident())
+        try:
+            with io.open(temp_file_name, "wb") as fptr:
+                fptr.write(struct.pack("I", len(key)))
+                fptr.write(key)
+                fptr.write(value)
+            os.replace(temp_file_name, file_name)
+        finally:
+            if exists(temp_file_name):
+                os.remove(temp_file_name)
 
     def _to_file_name(self, key):
         """
         Convert key to file name
         """
-        return join(self._path, str(self._keys_to_nodes[key]))
+        return join(self._path, hashlib.sha1(key).hexdigest())
 
-    def _allocate_node_for_key(self, key):
+    @contextmanager
+    def transaction(self):
         """
-        Allocate a node index for a new key
+        Lock the database for a read-modify-write sequence
         """
-        assert key not in self._keys_to_nodes
-        self._keys_to_nodes[key] = self._next_node
-        self._next_node += 1
+        with io.open(join(self._path, ".lock"), "a") as fptr:
+            fcntl.flock(fptr, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fptr, fcntl.LOCK_UN)
 
     def __setitem__(self, key, value):
-        if key not in self._keys_to_nodes:
-            self._allocate_node_for_key(key)
         self._write_node(self._to_file_name(key), key, value)
 
     def __getitem__(self, key):
-        if key not in self:
+        data = self._read_node(self._to_file_name(key), key)
+        if data is None:
             raise KeyError(key)
+        return data
+
+    def __contains__(self, key):
+        return self._read_node(self._to_file_name(key), key) is not None
+
+
+class SqliteDataBase(object):
+    """
+    A database stored in a single sqlite3 file
+    both keys and values are bytes
 
-        return self._read_data(self._to_file_name(key))
+    Unlike DataBase opening does not read every key, each write is an
+    atomic transaction and concurrent readers never see partial values.
+    The default rollback journal is kept since WAL mode does not work on NFS.
+    Several processes may share the file, a writer waits up to timeout
+    seconds for the lock held by another one
+    """
+
+    def __init__(self, path, new=False, timeout=60.0):
+        """
+        Create database in path
+        - path is a file
+        - new create new database
+        """
+        self._path = path
+
+        if dirname(path) and not exists(dirname(path)):
+            os.makedirs(dirname(path), exist_ok=True)
+
+        self._lock = threading.RLock()
+        try:
+            self._connect(timeout, new)
+        except sqlite3.DatabaseError:
+            if not new:
+                raise
+            # Not a database, start over
+            self._connection.close()
+            os.remove(path)
+            self._connect(timeout, new)
+
+    def _connect(self, timeout, new):
+        # Transactions are handled explicitly
+        self._connection = sqlite3.connect(self._path, timeout=timeout,
+                                           isolation_level=None, check_same_thread=False)
+        with self.transaction():
+            self._connection.execute("CREATE TABLE IF NOT EXISTS nodes "
+                                     "(key BLOB PRIMARY KEY, value BLOB NOT NULL)")
+            if new:
+                self.clear()
+
+    def clear(self):
+        """
+        Remove all keys, other processes may have the file open
+        so it is cleared instead of removed
+        """
+        with self.transaction():
+            self._connection.execute("DELETE FROM nodes")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Lock the database for a read-modify-write sequence.
+        The write lock is taken up front so that two processes
+        can not both read before either writes
+        """
+        with self._lock:
+            if self._connection.in_transaction:
+                yield
+                return
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO nodes (key, value) VALUES (?, ?)",
+                                     (key, value))
+
+    def __getitem__(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM nodes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return bytes(row[0])
 
     def __contains__(self, key):
-        return key in self._keys_to_nodes
+        with self._lock:
+            row = self._connection.execute("SELECT 1 FROM nodes WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def close(self):
+        self._connection.close()
 
 
 class PickledDataBase(object):
@@ -154,3 +240,6 @@ class PickledDataBase(object):
 
     def __contains__(self, key):
         return key in self._database
+
+    def transaction(self):
+        return self._database.transaction()
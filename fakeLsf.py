@@ -0,0 +1,207 @@
+#******************************************************************************
+# * Copyright (c) 2019, XtremeDV. All rights reserved.
+# *
+# * Licensed under the Apache License, Version 2.0 (the "License");
+# * you may not use this file except in compliance with the License.
+# * You may obtain a copy of the License at
+# *
+# * http://www.apache.org/licenses/LICENSE-2.0
+# *
+# * Unless required by applicable law or agreed to in writing, software
+# * distributed under the License is distributed on an "AS IS" BASIS,
+# * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# * See the License for the specific language governing permissions and
+# * limitations under the License.
+# *
+# * Author: Jude Zhang, Email: zhajio.1988@gmail.com
+# *******************************************************************************
+"""
+Local stand-in for the LSF commands bsub, bjobs and bkill to try
+'yasaTop.py ... lsf -batch' without an LSF cluster.
+
+    python fakeLsf.py install DIR      write bsub, bjobs and bkill to DIR
+    export PATH=DIR:$PATH
+
+Jobs run on the local host, at most YASA_FAKE_LSF_SLOTS (default 4)
+at a time. The state of the jobs is kept in YASA_FAKE_LSF_DIR, by default
+fake_lsf_<uid> in the temp dir. Only the options used by YASA are
+understood: -J name[1-N]%limit, -I/-Is run the job in the foreground,
+the other bsub options are ignored. bjobs prints 'jobid jobindex stat'
+whatever -o asks for.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import fcntl
+import signal
+import tempfile
+import subprocess
+import psutil
+
+# bsub options followed by a value
+VALUE_OPTIONS = ('-J', '-q', '-R', '-o', '-e', '-W', '-n', '-P', '-G', '-m', '-u')
+# bsub options running the job in the foreground
+INTERACTIVE_OPTIONS = ('-I', '-Is', '-Ip', '-K')
+
+
+def stateDir():
+    path = os.environ.get('YASA_FAKE_LSF_DIR',
+                          os.path.join(tempfile.gettempdir(), 'fake_lsf_%i' % os.getuid()))
+    if not os.path.exists(path):
+        os.makedirs(path, exist_ok=True)
+    return path
+
+def jobFile(jobId):
+    return os.path.join(stateDir(), '%s.json' % jobId)
+
+def readJob(jobId):
+    try:
+        with open(jobFile(jobId)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def writeJob(job):
+    tmp = jobFile(job['id']) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp, jobFile(job['id']))
+
+def newJobId():
+    """
+    Return the next job id, ids are unique within the state dir
+    """
+    with open(os.path.join(stateDir(), 'counter'), 'a+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        jobId = int(f.read() or 1000) + 1
+        f.seek(0)
+        f.truncate()
+        f.write(str(jobId))
+    return jobId
+
+def bsub(argv):
+    name = 'job'
+    interactive = False
+    idx = 0
+    while idx < len(argv) and argv[idx].startswith('-'):
+        if argv[idx] in INTERACTIVE_OPTIONS:
+            interactive = True
+        elif argv[idx] == '-J':
+            name = argv[idx + 1]
+        if argv[idx] in VALUE_OPTIONS:
+            idx += 1
+        idx += 1
+    command = " ".join(argv[idx:])
+    if interactive:
+        return subprocess.call(command, shell=True)
+
+    size, limit = 1, 0
+    match = re.match(r"(.*)\[1-(\d+)\](?:%(\d+))?$", name)
+    if match:
+        name, size, limit = match.group(1), int(match.group(2)), int(match.group(3) or 0)
+    slots = int(os.environ.get('YASA_FAKE_LSF_SLOTS', '4'))
+    jobId = newJobId()
+    writeJob({'id': jobId,
+              'name': name,
+              'command': command,
+              'cwd': os.getcwd(),
+              'array': match is not None,
+              'slots': min(slots, limit) if limit else slots,
+              'pid': None,
+              'states': dict((str(index), 'PEND') for index in range(1, size + 1))})
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), '_run', str(jobId)],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
+    print('Job <%i> is submitted to default queue <normal>.' % jobId)
+    return 0
+
+def runJob(jobId):
+    """
+    Run the elements of a job, the body of the process started by bsub
+    """
+    job = readJob(jobId)
+    job['pid'] = os.getpid()
+    writeJob(job)
+    pending = sorted(job['states'], key=int)
+    running = {}
+    while pending or running:
+        while pending and len(running) < job['slots']:
+            index = pending.pop(0)
+            env = dict(os.environ, LSB_JOBID=str(jobId), LSB_JOBINDEX=index if job['array'] else '0')
+            running[index] = subprocess.Popen(job['command'], shell=True, cwd=job['cwd'], env=env,
+                                              stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                              stderr=subprocess.DEVNULL)
+            job['states'][index] = 'RUN'
+        for index, proc in list(running.items()):
+            if proc.poll() is not None:
+                job['states'][index] = 'DONE' if proc.returncode == 0 else 'EXIT'
+                del running[index]
+        writeJob(job)
+        time.sleep(0.05)
+
+def bjobs(argv):
+    ids = [arg for arg in argv if arg.isdigit()]
+    for jobId in ids:
+        job = readJob(jobId)
+        if job is None:
+            sys.stderr.write('Job <%s> is not found\n' % jobId)
+            continue
+        for index in sorted(job['states'], key=int):
+            print('%s %s %s' % (jobId, index if job['array'] else '-', job['states'][index]))
+    return 0
+
+def bkill(argv):
+    for jobId in [arg for arg in argv if arg.isdigit()]:
+        job = readJob(jobId)
+        if job is None:
+            sys.stderr.write('Job <%s>: No matching job found\n' % jobId)
+            continue
+        if job['pid']:
+            # Elements run under timeout in process groups of their own
+            killTree(job['pid'])
+        job = readJob(jobId)
+        for index, state in job['states'].items():
+            if state not in ('DONE', 'EXIT'):
+                job['states'][index] = 'EXIT'
+        writeJob(job)
+        print('Job <%s> is being terminated' % jobId)
+    return 0
+
+def killTree(pid):
+    try:
+        parent = psutil.Process(pid)
+        procs = parent.children(recursive=True) + [parent]
+    except psutil.NoSuchProcess:
+        return
+    for proc in procs:
+        try:
+            proc.send_signal(signal.SIGKILL)
+        except psutil.NoSuchProcess:
+            pass
+
+def install(directory):
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    for command in ('bsub', 'bjobs', 'bkill'):
+        path = os.path.join(directory, command)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\nexec "%s" "%s" %s "$@"\n' % (sys.executable, os.path.abspath(__file__), command))
+        os.chmod(path, 0o755)
+    return 0
+
+COMMANDS = {'bsub': bsub, 'bjobs': bjobs, 'bkill': bkill}
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.stderr.write(__doc__)
+        sys.exit(2)
+    if sys.argv[1] == 'install':
+        sys.exit(install(sys.argv[2]))
+    if sys.argv[1] == '_run':
+        runJob(sys.argv[2])
+        sys.exit(0)
+    sys.exit(COMMANDS[sys.argv[1]](sys.argv[2:]))
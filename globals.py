@@ -4,8 +4,8 @@ import grp
 def checkEnv():
     if not 'YASA_SIMULATOR' in os.environ:
         raise EnvironmentError('$YASA_SIMULATOR is not defined')
-    elif not os.environ['YASA_SIMULATOR'] in ['vcs','irun','xrun']:
-        raise EnvironmentError('$YASA_SIMULATOR=%s is not inside supported tools["vcs", "irun", "xrun"]' % os.environ['YASA_SIMULATOR'])    
+    elif not os.environ['YASA_SIMULATOR'] in ['vcs','irun','xrun','fake']:
+        raise EnvironmentError('$YASA_SIMULATOR=%s is not inside supported tools["vcs", "irun", "xrun", "fake"]' % os.environ['YASA_SIMULATOR'])    
     if not 'PRJ_HOME' in os.environ:
         raise EnvironmentError('$PRJ_HOME is not defined')
     if not 'TEMP_ROOT' in os.environ:
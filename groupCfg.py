@@ -142,6 +142,63 @@ class groupSubCfg(includableCfg):
     def testsOption(self):
         return self._buildInOpts['tests']
 
+
+# Units of the size annotations of a test, in MB
+SIZE_UNITS = {'K': 1.0 / 1024, 'M': 1, 'G': 1024, 'T': 1024 * 1024}
+
+def parseSize(value):
+    """
+    Parse a memory size such as 512M or 20G, a plain number is in MB.
+    Returns the size in MB
+    """
+    value = value.strip().upper().rstrip('B')
+    unit = 1
+    if value and value[-1] in SIZE_UNITS:
+        unit = SIZE_UNITS[value[-1]]
+        value = value[:-1]
+    return float(value) * unit
+
+# Units of the duration annotations of a test, in seconds
+DURATION_UNITS = {'S': 1, 'M': 60, 'H': 3600}
+
+def parseDuration(value):
+    """
+    Parse a duration such as 90, 30m or 2h, a plain number is in seconds.
+    Returns the duration in seconds
+    """
+    value = value.strip().upper()
+    unit = 1
+    if value and value[-1] in DURATION_UNITS:
+        unit = DURATION_UNITS[value[-1]]
+        value = value[:-1]
+    return float(value) * unit
+
+# Annotations which may follow a test in group.cfg, they are not options
+# of the test but hints for YASA
+# ```
+# tests = soc_full mem=20G timeout=3h
+# ```
+TEST_ANNOTATIONS = {'mem': parseSize,
+                    'timeout': parseDuration}
+
+def splitAnnotations(argv):
+    """
+    Split the annotations of a test in group.cfg from its options.
+    Returns the remaining options and a dictionary of annotations
+    """
+    options = []
+    annotations = {}
+    for arg in argv:
+        name, sep, value = arg.partition('=')
+        if sep and name in TEST_ANNOTATIONS:
+            try:
+                annotations[name] = TEST_ANNOTATIONS[name](value)
+            except ValueError:
+                raise ValueError('invalid test annotation %s' % arg)
+        else:
+            options.append(arg)
+    return options, annotations
+
 #if __name__ == '__main__':
 #    config = ConfigObj(infile=defaultGroupFile(), stringify=True)
 #    group = groupCfg('test', config['testgroup'])
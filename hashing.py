@@ -22,6 +22,11 @@ Wrapper arround selected hash method
 """
 
 import hashlib
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 def hash_string(string):
@@ -29,3 +34,92 @@ def hash_string(string):
     returns hash of bytes
     """
     return hashlib.sha1(string.encode(encoding="utf-8")).hexdigest()
+
+
+def hash_file(file_name, block_size=1024 * 1024):
+    """
+    returns hash of the content of a file, read in blocks
+    """
+    sha = hashlib.sha1()
+    with open(file_name, "rb") as fptr:
+        for block in iter(lambda: fptr.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class FileHasher(object):
+    """
+    Hash the content of many files on a thread pool
+
+    Digests are cached by path together with the size, modification time
+    and inode of the file, an unchanged file is never read again.
+    The cache is kept in cache_file between runs when given
+    """
+    # A file modified this recently may change again without changing its
+    # modification time, its digest is not cached
+    RACY_SECONDS = 2.0
+
+    def __init__(self, cache_file=None, num_threads=8):
+        self._cache_file = cache_file
+        self._num_threads = num_threads
+        self._lock = threading.Lock()
+        self._cache = self._load()
+        self._modified = False
+
+    def _load(self):
+        if self._cache_file is None:
+            return {}
+        try:
+            with open(self._cache_file, "rb") as fptr:
+                cache = pickle.load(fptr)
+            return cache if isinstance(cache, dict) else {}
+        except Exception:  # pylint: disable=broad-except
+            return {}
+
+    def save(self):
+        """
+        Save the cache to cache_file, replacing it atomically
+        """
+        if self._cache_file is None or not self._modified:
+            return
+        temp_file = "%s.%i.tmp" % (self._cache_file, os.getpid())
+        with self._lock:
+            with open(temp_file, "wb") as fptr:
+                pickle.dump(self._cache, fptr, protocol=pickle.HIGHEST_PROTOCOL)
+            self._modified = False
+        os.replace(temp_file, self._cache_file)
+
+    def hash_files(self, file_names):
+        """
+        Return a dict mapping each file name to the hash of its content,
+        None for files that can not be read
+        """
+        file_names = list(file_names)
+        with ThreadPoolExecutor(max_workers=self._num_threads) as executor:
+            return dict(zip(file_names, executor.map(self.hash_file, file_names)))
+
+    def hash_file(self, file_name):
+        """
+        Return the hash of the content of file_name, None if it can not be read
+        """
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return None
+
+        key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        with self._lock:
+            cached = self._cache.get(file_name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        try:
+            digest = hash_file(file_name)
+        except (IOError, OSError):
+            return None
+
+        if time.time() - stat.st_mtime > self.RACY_SECONDS:
+            with self._lock:
+                self._cache[file_name] = (key, digest)
+                self._modified = True
+        return digest
@@ -52,6 +52,13 @@ class lsfCli(object):
         lsfSubParser.add_argument('-job_name', dest='lsfJobName', action=jobNameArgsAction,
                             help='Assigns the specified name to the job.')        
 
+        lsfSubParser.add_argument('-batch', dest='lsfBatch', action='store_true', default=False,
+                            help='Submit the tests as LSF job arrays instead of one interactive job per test, '
+                                 'the number of jobs in flight is then not limited by -p.')
+
+        lsfSubParser.add_argument('-batch_size', dest='lsfBatchSize', type=positive_int, default=1000,
+                            help='Largest number of tests in one LSF job array with -batch.')
+
     def setParsedArgs(self, parsedArgs):
         self.args = parsedArgs
         appendAttr(self.args, 'lsfOptions', '')
@@ -0,0 +1,271 @@
+#******************************************************************************
+# * Copyright (c) 2019, XtremeDV. All rights reserved.
+# *
+# * Licensed under the Apache License, Version 2.0 (the "License");
+# * you may not use this file except in compliance with the License.
+# * You may obtain a copy of the License at
+# *
+# * http://www.apache.org/licenses/LICENSE-2.0
+# *
+# * Unless required by applicable law or agreed to in writing, software
+# * distributed under the License is distributed on an "AS IS" BASIS,
+# * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# * See the License for the specific language governing permissions and
+# * limitations under the License.
+# *
+# * Author: Jude Zhang, Email: zhajio.1988@gmail.com
+# *******************************************************************************
+"""
+Run tests as LSF batch jobs instead of one interactive bsub per test
+"""
+
+import os
+import re
+import math
+import time
+import shlex
+import signal
+import logging
+import subprocess
+import ostools
+from test_runner import TestRunner
+from test_report import FAILED, CANCELLED
+
+LOGGER = logging.getLogger(__name__)
+
+# Written by the job of a test when it ends: exit code, start and end time
+EXIT_FILE = '.yasa_exit'
+# Script run by the job of a test, in the test work dir
+JOB_SCRIPT = 'lsf_job.sh'
+# Seconds between two bjobs queries for all job arrays
+POLL_INTERVAL = 5.0
+# Seconds an ended job gets to show its exit file, NFS may show it late
+EXIT_FILE_DELAY = 30.0
+# LSF states of ended jobs
+ENDED_STATES = ('DONE', 'EXIT')
+# Exit codes of timeout(1) when it stopped the simulation
+TIMEOUT_EXIT_CODES = (124, 128 + signal.SIGKILL)
+
+
+class LsfBatchRunner(TestRunner):
+    """
+    Run the test suites as elements of LSF job arrays.
+
+    Every test gets a job script in its work dir which runs the simulation
+    and writes EXIT_FILE when done. Tests are submitted in job arrays of at
+    most batch_size elements, each element finds its work dir by
+    LSB_JOBINDEX. bjobs is queried for all arrays at once every
+    POLL_INTERVAL seconds, only the exit files of the jobs it reports as
+    ended are read. No thread, pipe or terminal is held per job, so the
+    number of jobs in flight is only limited by LSF
+    """
+    def __init__(self, report, lsf_options=None, job_name='yasa', batch_size=1000, **kwargs):
+        """
+        - lsf_options are the bsub options of every job array, such as -q
+        - job_name is the name of the job arrays
+        - batch_size is the largest number of tests in one job array
+        """
+        super(LsfBatchRunner, self).__init__(report, **kwargs)
+        self._lsf_options = lsf_options or []
+        self._job_name = job_name
+        self._batch_size = batch_size
+        self._job_ids = []
+
+    def run(self, test_suites):
+        """
+        Submit the test suites and wait until all of them are done
+        """
+        test_suites = list(test_suites)
+        num_tests = sum(len(test_suite.test_names) for test_suite in test_suites)
+        self._report.set_expected_num_tests(num_tests)
+
+        # Test suites by LSF job id and array index
+        pending = {}
+        try:
+            for number, first in enumerate(range(0, len(test_suites), self._batch_size)):
+                batch = test_suites[first:first + self._batch_size]
+                job_id = self._submit(batch, number)
+                for index, test_suite in enumerate(batch, 1):
+                    pending[(job_id, str(index))] = test_suite
+
+            self._wait(pending, num_tests)
+
+        except KeyboardInterrupt:
+            LOGGER.debug("LsfBatchRunner: Caught Ctrl-C killing the jobs")
+            self._kill_jobs()
+            raise
+
+        finally:
+            if self._show_progress:
+                self._report.end_progress()
+
+    def _submit(self, test_suites, number):
+        """
+        Submit test_suites as one job array and return its job id
+        """
+        for test_suite in test_suites:
+            self._write_job_script(test_suite)
+
+        root = os.path.dirname(test_suites[0].work_dir)
+        list_file = os.path.join(root, '.yasa_lsf_%i.list' % number)
+        driver = os.path.join(root, '.yasa_lsf_%i.sh' % number)
+        ostools.write_file(list_file, "".join(test_suite.work_dir + "\n" for test_suite in test_suites))
+        ostools.write_file(driver, '#!/bin/sh\nexec sh "$(sed -n "${LSB_JOBINDEX}p" %s)/%s"\n'
+                           % (shlex.quote(list_file), JOB_SCRIPT))
+
+        cmd = (['bsub', '-J', '%s[1-%i]' % (self._job_name, len(test_suites)), '-o', os.devnull]
+               + self._lsf_options + ['sh', driver])
+        LOGGER.debug("LsfBatchRunner: %s", " ".join(cmd))
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              universal_newlines=True)
+        match = re.search(r"Job <(\d+)>", proc.stdout)
+        if proc.returncode != 0 or match is None:
+            raise RuntimeError("bsub failed to submit %i tests: %s" % (len(test_suites), proc.stdout.strip()))
+
+        job_id = match.group(1)
+        self._job_ids.append(job_id)
+        if not self._is_quiet:
+            print("Submitted %i tests as LSF job array %s" % (len(test_suites), job_id))
+        return job_id
+
+    def _write_job_script(self, test_suite):
+        """
+        Write the script simulating test_suite in its work dir, the
+        simulation is signalled like by the local watchdog on timeout
+        """
+        work_dir = test_suite.work_dir
+        exit_file = os.path.join(work_dir, EXIT_FILE)
+        if os.path.exists(exit_file):
+            os.remove(exit_file)
+        ostools.write_file(test_suite.test_result_file, "")
+
+        timeout = ''
+        if test_suite.timeout:
+            grace = int(math.ceil(ostools.WATCHDOG.grace))
+            if grace > 0:
+                timeout = 'timeout -s %s -k %i %i ' % (signal.Signals(ostools.WATCHDOG.soft_signal).name[3:],
+                                                      grace, int(math.ceil(test_suite.timeout)))
+            else:
+                timeout = 'timeout -s KILL %i ' % int(math.ceil(test_suite.timeout))
+
+        output = self._sim_output_file(test_suite, False) or os.devnull
+        ostools.write_file(os.path.join(work_dir, JOB_SCRIPT),
+                           "#!/bin/sh\n"
+                           "cd %(dir)s\n"
+                           "start=$(date +%%s.%%N)\n"
+                           "%(timeout)ssh -c %(cmd)s > %(output)s 2>&1\n"
+                           "code=$?\n"
+                           'echo "$code $start $(date +%%s.%%N)" > %(exit)s.tmp && mv %(exit)s.tmp %(exit)s\n'
+                           % dict(dir=shlex.quote(work_dir),
+                                  timeout=timeout,
+                                  cmd=shlex.quote(test_suite.sim_cmd),
+                                  output=shlex.quote(output),
+                                  exit=EXIT_FILE))
+
+    def _wait(self, pending, num_tests):
+        """
+        Collect the results of the pending test suites as their jobs end
+        """
+        # Time at which bjobs first reported a job as ended without exit file
+        ended = {}
+        while pending:
+            if self._abort:
+                self._kill_jobs()
+                for test_suite in pending.values():
+                    self._suite_done(test_suite, self._cancelled_suite(test_suite), ostools.get_time(), num_tests)
+                return
+
+            time.sleep(POLL_INTERVAL)
+            states = self._job_states()
+            if states is None:
+                continue
+
+            now = time.time()
+            for key, test_suite in list(pending.items()):
+                # Jobs are missing when LSF forgot them long after they
+                # ended, or did not list them yet right after bsub
+                state = states.get(key)
+                if state is not None and state not in ENDED_STATES:
+                    continue
+                exit_status = self._read_exit_file(test_suite)
+                if exit_status is not None:
+                    del pending[key]
+                    self._collect(test_suite, exit_status, num_tests)
+                elif state is not None and now - ended.setdefault(key, now) > EXIT_FILE_DELAY:
+                    del pending[key]
+                    self._suite_done(test_suite, self._lost_suite(test_suite, state), ostools.get_time(), num_tests)
+                if self._abort:
+                    break
+
+    @staticmethod
+    def _read_exit_file(test_suite):
+        """
+        Return the exit code, start and end time of the job of test_suite
+        or None while it did not end
+        """
+        try:
+            with open(os.path.join(test_suite.work_dir, EXIT_FILE)) as fptr:
+                code, start, end = fptr.read().split()
+        except (OSError, ValueError):
+            return None
+        return int(code), float(start), float(end)
+
+    def _collect(self, test_suite, exit_status, num_tests):
+        """
+        Check the log of an ended job and add its results, a simulation
+        which did not exit with code 0 fails whatever its log says
+        """
+        code, start, end = exit_status
+        results = test_suite.collect()
+        if code != 0:
+            timed_out = bool(test_suite.timeout) and code in TIMEOUT_EXIT_CODES
+            for result in results.values():
+                if timed_out:
+                    result['reasonMsg'] = 'Killed by the %.0f seconds timeout' % test_suite.timeout
+                elif result['status'] != FAILED:
+                    result['reasonMsg'] = 'Simulation exited with code %i' % code
+                result['status'] = FAILED
+        # The report takes the runtime since start_time, make it the runtime of the job
+        self._suite_done(test_suite, results, ostools.get_time() - (end - start), num_tests)
+
+    def _job_states(self):
+        """
+        Return the LSF state of the elements of all job arrays by job id and
+        index, None when bjobs failed
+        """
+        proc = subprocess.run(['bjobs', '-noheader', '-o', 'jobid jobindex stat'] + self._job_ids,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        states = {}
+        for line in proc.stdout.splitlines():
+            fields = line.split()
+            if len(fields) == 3:
+                states[(fields[0], fields[1])] = fields[2]
+        if not states and proc.returncode != 0:
+            LOGGER.debug("LsfBatchRunner: bjobs failed with code %i", proc.returncode)
+            return None
+        return states
+
+    def _kill_jobs(self):
+        if self._job_ids:
+            subprocess.run(['bkill'] + self._job_ids, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def _abort_run(self):
+        """
+        Stop waiting for the jobs, they are killed and reported as cancelled
+        """
+        LOGGER.debug("LsfBatchRunner: Failure with fail fast, killing the jobs")
+        self._abort = True
+
+    def _cancelled_suite(self, test_suite):
+        results = self._fail_suite(test_suite)
+        for name in results:
+            results[name]['status'] = CANCELLED
+            results[name]['reasonMsg'] = 'Cancelled since another test failed'
+        return results
+
+    def _lost_suite(self, test_suite, state):
+        results = self._fail_suite(test_suite)
+        for name in results:
+            results[name]['status'] = FAILED
+            results[name]['reasonMsg'] = 'LSF job ended (%s) before the simulation did' % state
+        return results
@@ -26,16 +26,20 @@ from __future__ import print_function
 import time
 import subprocess
 import threading
-import psutil
 import shutil
 import sys
 import signal
+import selectors
+import weakref
+import heapq
+import itertools
+from collections import deque
 try:
     # Python 3.x
-    from queue import Queue, Empty
+    from queue import Empty
 except ImportError:
     # Python 2.7
-    from Queue import Queue, Empty  # pylint: disable=import-error
+    from Queue import Empty  # pylint: disable=import-error
 
 from os.path import exists, getmtime, dirname, relpath, splitdrive
 import os
@@ -51,6 +55,7 @@ class ProgramStatus(object):
     def __init__(self):
         self._lock = threading.Lock()
         self._shutting_down = False
+        self._conditions = weakref.WeakSet()
 
     @property
     def is_shutting_down(self):
@@ -61,10 +66,23 @@ class ProgramStatus(object):
         if self.is_shutting_down:
             raise KeyboardInterrupt
 
+    def register(self, condition):
+        """
+        Register a condition variable which is notified on shutdown
+        such that threads waiting on it wake up immediately
+        """
+        with self._lock:  # pylint: disable=not-context-manager
+            self._conditions.add(condition)
+
     def shutdown(self):
         with self._lock:  # pylint: disable=not-context-manager
             LOGGER.debug("ProgramStatus.shutdown")
             self._shutting_down = True
+            conditions = list(self._conditions)
+
+        for condition in conditions:
+            with condition:
+                condition.notify_all()
 
     def reset(self):
         with self._lock:  # pylint: disable=not-context-manager
@@ -80,46 +98,78 @@ class InterruptableQueue(object):
     """
 
     def __init__(self):
-        self._queue = Queue()
+        self._condition = threading.Condition()
+        self._items = deque()
+        PROGRAM_STATUS.register(self._condition)
 
-    def get(self):
+    def get(self, timeout=None):
         """
         Get a value from the queue
+
+        @raises Empty when no value arrived within timeout seconds
         """
-        while True:
-            PROGRAM_STATUS.check_for_shutdown()
-            try:
-                return self._queue.get(timeout=0.1)
-            except Empty:
-                pass
+        with self._condition:
+            if timeout is not None:
+                deadline = time.time() + timeout
+            while not self._items:
+                PROGRAM_STATUS.check_for_shutdown()
+                if timeout is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise Empty
+                    self._condition.wait(remaining)
+            return self._items.popleft()
 
     def put(self, value):
-        self._queue.put(value)
+        with self._condition:
+            self._items.append(value)
+            self._condition.notify()
 
     def empty(self):
-        return self._queue.empty()
+        with self._condition:
+            return not self._items
 
 
 class Process(object):
     """
     A simple process interface which supports asynchronously consuming the stdout and stderr
     of the process while it is running.
+
+    The output is drained by the shared OUTPUT_MULTIPLEXER thread and
+    handed over to the consumer in batches of lines. When an output file
+    name is given the stdout and stderr of the process are written
+    directly to that file instead and never pass through Python.
     """
 
     class NonZeroExitCode(Exception):
         pass
 
-    def __init__(self, cmd, cwd=None, env=None):
+    class Aborted(NonZeroExitCode):
+        """
+        The process was terminated because the monitor asked for it
+        """
+
+    # Seconds to wait for killed processes to go away
+    KILL_TIMEOUT = 5.0
+
+    def __init__(self, cmd, cwd=None, env=None, output=None):
         self._cmd = cmd
         self._cwd = cwd
 
+        if output is None:
+            stdout = subprocess.PIPE
+        else:
+            stdout = io.open(output, "wb")
+
         # Create process with new process group
         # Sending a signal to a process group will send it to all children
         # Hopefully this way no orphaned processes will be left behind
         self._process = subprocess.Popen(
             self._cmd,
             cwd=self._cwd,
-            stdout=subprocess.PIPE,
+            stdout=stdout,
             stdin=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             universal_newlines=True,
@@ -128,11 +178,17 @@ class Process(object):
             # Create new process group on POSIX, setpgrp does not exist on Windows
             #preexec_fn=os.setsid)
             preexec_fn=os.setpgrp)  # pylint: disable=no-member
+        # The process is the leader of its group
+        self._pgid = self._process.pid
+        if output is not None:
+            # The child has its own copy of the file descriptor
+            stdout.close()
         LOGGER.debug("Started process with pid=%i: '%s'", self._process.pid, (" ".join(self._cwd)))
 
         self._queue = InterruptableQueue()
-        self._reader = AsynchronousFileReader(self._process.stdout, self._queue)
-        self._reader.start()
+        self._pending = deque()
+        self._eof = False
+        self._channel = OUTPUT_MULTIPLEXER.register(self._process, self._queue)
 
     def write(self, *args, **kwargs):
         """ Write to stdin """
@@ -145,31 +201,57 @@ class Process(object):
             self._process.stdin.write(line + "\n")
             self._process.stdin.flush()
 
+    def _next_lines(self, timeout=None):
+        """
+        Return the next batch of lines or None at end of file
+
+        @raises Empty when nothing arrived within timeout seconds
+        """
+        if self._eof:
+            return None
+
+        lines = self._queue.get(timeout)
+        if lines is None:
+            self._eof = True
+        return lines
+
     def next_line(self):
         """
         Return either the next line or the exit code
         """
 
-        if not self._reader.eof():
+        if not self._pending:
             # Show what we received from standard output.
-            msg = self._queue.get()
+            lines = self._next_lines()
+            if lines is not None:
+                self._pending.extend(lines)
 
-            if msg is not None:
-                return msg
+        if self._pending:
+            return self._pending.popleft()
 
         retcode = self.wait()
         return retcode
 
     def wait(self):
         """
-        Wait while without completely blocking to avoid
-        deadlock when shutting down
+        Wait for the process to exit, the output multiplexer notifies
+        the channel when the process has exited and a shutdown notifies
+        it as well to avoid deadlock when shutting down
+        """
+        return self._channel.wait_for_exit()
+
+    @property
+    def usage(self):
+        """
+        Resource usage of the process and the children it waited for,
+        a dict with max_rss_mb, user_time, sys_time, read_bytes and
+        write_bytes. None while running or when not available
         """
-        while self._process.poll() is None:
-            PROGRAM_STATUS.check_for_shutdown()
-            time.sleep(0.05)
-            LOGGER.debug("Waiting for process with pid=%i to stop", self._process.pid)
-        return self._process.returncode
+        return self._channel.usage
+
+    @property
+    def pid(self):
+        return self._process.pid
 
     def is_alive(self):
         """
@@ -177,13 +259,31 @@ class Process(object):
         """
         return self._process.poll() is None
 
-    def consume_output(self, callback=print):
+    def send_signal(self, sig):
+        """
+        Send sig to the process group of the process, which contains all
+        its children that did not create a process group of their own.
+        The group is signalled as long as some of its processes run, also
+        after the leader exited, for example a simulator that traps the
+        signal which ended its shell
+        """
+        if not self._group_alive():
+            return
+        try:
+            os.killpg(self._pgid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def consume_output(self, callback=print, monitor=None, monitor_interval=1.0):
         """
         Consume the output of the process.
         The output is interpreted as UTF-8 text.
 
         @param callback Called for each line of output
+        @param monitor Called every monitor_interval seconds while the process is running,
+               the process is terminated when it returns something else than None
         @raises Process.NonZeroExitCode when the process does not exit with code zero
+        @raises Process.Aborted when the process was terminated on request of the monitor
         """
 
         def default_callback(*args, **kwargs):
@@ -192,97 +292,503 @@ class Process(object):
         if not callback:
             callback = default_callback
 
-        while not self._reader.eof():
-            line = self._queue.get()
-            if line is None:
-                break
-            if callback(line) is not None:
+        timeout = None
+        next_monitor = None
+        if monitor is not None:
+            timeout = monitor_interval
+            next_monitor = time.time() + monitor_interval
+
+        def check_monitor():
+            """
+            Call the monitor when it is due and return the time to wait for the next call
+            """
+            nonlocal next_monitor
+            if monitor is None:
+                return None
+
+            now = time.time()
+            if now >= next_monitor:
+                if monitor() is not None:
+                    LOGGER.debug("Monitor aborts process with pid=%i", self._process.pid)
+                    self.terminate()
+                    raise Process.Aborted
+                next_monitor = now + monitor_interval
+            return next_monitor - now
+
+        while self._pending:
+            if callback(self._pending.popleft()) is not None:
                 return
 
+        while True:
+            try:
+                lines = self._next_lines(timeout)
+            except Empty:
+                lines = []
+            if lines is None:
+                break
+            for line in lines:
+                if callback(line) is not None:
+                    return
+            timeout = check_monitor()
+
         retcode = None
         while retcode is None:
-            retcode = self.wait()
-            if retcode != 0:
+            retcode = self._channel.wait_for_exit(timeout)
+            if retcode is None:
+                timeout = check_monitor()
+            elif retcode != 0:
                 raise Process.NonZeroExitCode
 
     def terminate(self):
         """
-        Terminate the process
+        Terminate the process and its children by killing its process
+        group. The output multiplexer reaps the process, so the processes
+        of several threads are torn down concurrently
         """
-        if self._process.poll() is None:
-            process = psutil.Process(self._process.pid)
-            proc_list = process.children(recursive=True)
-            #proc_list.reverse()
-            for proc in proc_list:
-                proc.kill()
-            process.kill()
-
-        # Let's be tidy and join the threads we've started.
-        if self._process.poll() is None:
-            LOGGER.debug("Terminating process with pid=%i", self._process.pid)
-            self._process.terminate()
-
-        if self._process.poll() is None:
-            time.sleep(0.05)
-
-        if self._process.poll() is None:
-            LOGGER.debug("Killing process with pid=%i", self._process.pid)
-            self._process.kill()
-
-        if self._process.poll() is None:
-            LOGGER.debug("Waiting for process with pid=%i", self._process.pid)
-            self.wait()
-
-        LOGGER.debug("Process with pid=%i terminated with code=%i",
-                     self._process.pid,
-                     self._process.returncode)
-
-        self._reader.join()
-        self._process.stdout.close()
+        if self._group_alive():
+            LOGGER.debug("Killing process group %i", self._pgid)
+            self.send_signal(signal.SIGKILL)
+            if self._channel.wait_for_exit(self.KILL_TIMEOUT, interruptible=False) is None:
+                LOGGER.warning("Process with pid=%i did not exit after being killed", self._process.pid)
+            else:
+                LOGGER.debug("Process with pid=%i terminated with code=%i",
+                             self._process.pid,
+                             self._process.returncode)
+            if not self.wait_for_group(self.KILL_TIMEOUT, signal.SIGKILL):
+                LOGGER.warning("Processes of group %i survived being killed", self._pgid)
+
+        self._channel.wait_for_close()
+        if self._process.stdout is not None:
+            self._process.stdout.close()
         self._process.stdin.close()
 
+    def wait_for_group(self, timeout, sig=None):
+        """
+        Wait until no process of the process group runs anymore, sending
+        sig again to the processes left. Returns False on timeout
+        """
+        deadline = time.time() + timeout
+        delay = 0.001
+        while self._group_alive():
+            if time.time() > deadline:
+                return False
+            if sig is not None:
+                self.send_signal(sig)
+            time.sleep(delay)
+            delay = min(2 * delay, 0.1)
+        return True
+
+    def _group_alive(self):
+        """
+        Return True while some process of the process group runs.
+        The group id can not be reused before its last process, even a
+        zombie, is gone, so it is safe to signal while this holds.
+        Killed orphans are zombies until init reaps them, they do not count
+        """
+        if self._process.returncode is None:
+            # The leader, running or not reaped yet, holds the group id
+            return True
+        try:
+            os.killpg(self._pgid, 0)
+        except (ProcessLookupError, PermissionError):
+            return False
+        return _group_has_running_process(self._pgid)
+
     def __del__(self):
         try:
             self.terminate()
         except KeyboardInterrupt:
             LOGGER.debug("Process.__del__: Ignoring KeyboardInterrupt")
 
-class AsynchronousFileReader(threading.Thread):
+
+def _group_has_running_process(pgid):
     """
-    Helper class to implement asynchronous reading of a file
-    in a separate thread. Pushes read lines on a queue to
-    be consumed in another thread.
+    Return True when a process of group pgid is not a zombie. Without
+    /proc every process of the group counts as running
     """
+    try:
+        pids = [name for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return True
 
-    def __init__(self, fd, queue, encoding="utf-8"):
-        threading.Thread.__init__(self)
+    for pid in pids:
+        try:
+            with open('/proc/%s/stat' % pid, 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name in parentheses may contain spaces
+        fields = stat[stat.rindex(b')') + 2:].split()
+        if int(fields[2]) == pgid and fields[0] not in (b'Z', b'X'):
+            return True
+    return False
+
+
+class ProcessChannel(object):
+    """
+    State of one child process shared between its Process object and the
+    output multiplexer thread. Only the Popen object is referenced such
+    that the owning Process can still be garbage collected.
+    """
 
-        # If Python 3 change encoding of TextIOWrapper to utf-8 ignoring decode errors
-        if isinstance(fd, io.TextIOWrapper):
-            fd = io.TextIOWrapper(fd.buffer, encoding=encoding, errors="ignore")
+    def __init__(self, process, queue):
+        self.process = process
+        self.queue = queue
+        self.condition = threading.Condition()
+        PROGRAM_STATUS.register(self.condition)
+        self.fd = None if process.stdout is None else process.stdout.fileno()
+        self.pidfd = None
+        self.buffer = b""
+        self.closed = self.fd is None
+        self.exited = False
+        self.usage = None
+
+    def wait_for_exit(self, timeout=None, interruptible=True):
+        """
+        Block until the process has exited and return the exit code,
+        returns None if the process is still running after timeout seconds.
+        An interruptible wait raises KeyboardInterrupt on shutdown
+        """
+        with self.condition:
+            if timeout is not None:
+                deadline = time.time() + timeout
+            while not self.exited:
+                if interruptible:
+                    PROGRAM_STATUS.check_for_shutdown()
+                LOGGER.debug("Waiting for process with pid=%i to stop", self.process.pid)
+                if timeout is None:
+                    self.condition.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self.condition.wait(remaining)
+        return self.process.returncode
+
+    def wait_for_close(self):
+        """
+        Block until the output pipe has been drained and unregistered
+        """
+        with self.condition:
+            while not self.closed:
+                self.condition.wait()
 
-        self._fd = fd
-        self._queue = queue
+    def set_exited(self):
+        with self.condition:
+            self.exited = True
+            self.condition.notify_all()
+
+    def set_closed(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+def _exit_code(status):
+    """
+    Convert a wait status to a Popen returncode
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _usage(rusage):
+    """
+    Convert a resource.struct_rusage, ru_maxrss is in kilobytes on Linux
+    and block counts are in 512 byte units
+    """
+    return {'max_rss_mb': round(rusage.ru_maxrss / 1024.0, 1),
+            'user_time': round(rusage.ru_utime, 3),
+            'sys_time': round(rusage.ru_stime, 3),
+            'read_bytes': rusage.ru_inblock * 512,
+            'write_bytes': rusage.ru_oublock * 512}
+
+
+class OutputMultiplexer(object):
+    """
+    Drain the output pipes of all child processes in a single thread
+    using a selector instead of one reader thread per process.
+
+    Complete lines are pushed in batches to the queue of each process
+    followed by None at end of file. Process exit is watched through a
+    pidfd when the platform supports it, otherwise the exit status of
+    the remaining processes is polled.
+    """
+
+    POLL_INTERVAL = 0.05
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, encoding="utf-8"):
+        self._lock = threading.Lock()
         self._encoding = encoding
+        self._selector = None
+        self._thread = None
+        self._wakeup_read = None
+        self._wakeup_write = None
+        self._new_channels = []
+        self._polled = set()
+
+    def register(self, process, queue):
+        """
+        Start draining the output of process into queue,
+        returns the ProcessChannel used to wait for the process
+        """
+        channel = ProcessChannel(process, queue)
+        if channel.fd is not None:
+            os.set_blocking(channel.fd, False)
+        else:
+            queue.put(None)
 
-    def run(self):
-        """The body of the thread: read lines and put them on the queue."""
-        for line in iter(self._fd.readline, ""):
-            if PROGRAM_STATUS.is_shutting_down:
-                break
+        try:
+            # Open the pidfd in the calling thread before the process
+            # can possibly have been reaped
+            channel.pidfd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError):
+            channel.pidfd = None
+
+        with self._lock:  # pylint: disable=not-context-manager
+            self._start()
+            self._new_channels.append(channel)
+        os.write(self._wakeup_write, b"\0")
+        return channel
+
+    def _start(self):
+        """
+        Lazily start the multiplexer thread
+        """
+        if self._thread is not None:
+            return
+
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_read, False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._run, name="OutputMultiplexer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _add_new_channels(self):
+        """
+        Register channels added by other threads in the selector
+        """
+        try:
+            while os.read(self._wakeup_read, 4096):
+                pass
+        except BlockingIOError:
+            pass
 
-            # Convert string into utf-8 if necessary
-            if sys.version_info.major == 2:
-                string = line[:-1].decode(encoding=self._encoding, errors="ignore")
+        with self._lock:  # pylint: disable=not-context-manager
+            channels = self._new_channels
+            self._new_channels = []
+
+        for channel in channels:
+            if channel.fd is not None:
+                self._selector.register(channel.fd, selectors.EVENT_READ, (channel, False))
+            if channel.pidfd is not None:
+                self._selector.register(channel.pidfd, selectors.EVENT_READ, (channel, True))
             else:
-                string = line[:-1]
+                self._polled.add(channel)
+
+    def _run(self):
+        """
+        The body of the multiplexer thread
+        """
+        while True:
+            timeout = self.POLL_INTERVAL if self._polled else None
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    self._add_new_channels()
+                    continue
+
+                channel, is_pidfd = key.data
+                if is_pidfd:
+                    self._selector.unregister(key.fd)
+                    os.close(key.fd)
+                    channel.pidfd = None
+                    self._reap(channel)
+                else:
+                    self._read(channel)
+
+            for channel in list(self._polled):
+                if self._reap(channel, os.WNOHANG):
+                    self._polled.discard(channel)
+
+    def _reap(self, channel, options=0):
+        """
+        Collect the exit status and resource usage of a process,
+        returns False when it is still running.
+        The returncode of the Popen object is set since the process
+        can not be waited for twice. If another thread polled the Popen
+        object first the resource usage is not available
+        """
+        process = channel.process
+        if process.returncode is None:
+            try:
+                pid, status, rusage = os.wait4(process.pid, options)
+            except ChildProcessError:
+                process.wait()
+            else:
+                if pid == 0:
+                    return False
+                process.returncode = _exit_code(status)
+                channel.usage = _usage(rusage)
+        channel.set_exited()
+        return True
+
+    def _read(self, channel):
+        """
+        Read available output of channel and push complete lines
+        """
+        try:
+            data = os.read(channel.fd, self.READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+
+        if data:
+            data = channel.buffer + data
+            end = data.rfind(b"\n")
+            if end < 0:
+                channel.buffer = data
+                return
+            channel.buffer = data[end + 1:]
+            channel.queue.put(self._split(data[:end]))
+            return
+
+        self._selector.unregister(channel.fd)
+        if channel.buffer:
+            channel.queue.put(self._split(channel.buffer))
+            channel.buffer = b""
+        channel.queue.put(None)
+        channel.set_closed()
+
+    def _split(self, data):
+        """
+        Convert output into a list of lines ignoring decode errors
+        """
+        text = data.decode(self._encoding, errors="ignore")
+        return text.replace("\r\n", "\n").split("\n")
+
+
+OUTPUT_MULTIPLEXER = OutputMultiplexer()
+
+
+class WatchdogEntry(object):
+    """
+    A process watched by the Watchdog, see Watchdog.watch
+    """
+    def __init__(self, process, soft_signal, grace):
+        self.process = process
+        self.soft_signal = soft_signal
+        self.grace = grace
+        # True once the deadline has passed
+        self.expired = False
+
+
+class Watchdog(object):
+    """
+    Kill processes which run past their deadline from a single thread
+    keeping a heap of deadlines, instead of one Timer thread per process.
+
+    At the deadline the process group first receives soft_signal such that
+    the simulator can flush its logs and coverage, it is killed when it is
+    still running grace seconds later. Without soft_signal or grace the
+    process group is killed at the deadline.
+    Cancelled entries stay in the heap until the heap is compacted or
+    their deadline passes, they no longer reference the process
+    """
+
+    def __init__(self, soft_signal=signal.SIGTERM, grace=30.0):
+        self.soft_signal = soft_signal
+        self.grace = grace
+        self._condition = threading.Condition()
+        self._heap = []
+        # Tie breaker of entries with the same deadline
+        self._counter = itertools.count()
+        self._num_cancelled = 0
+        self._thread = None
+
+    def watch(self, process, timeout, soft_signal=None, grace=None):
+        """
+        Kill process when it is still running after timeout seconds,
+        soft_signal and grace default to those of the watchdog.
+        Returns the entry to pass to cancel
+        """
+        entry = WatchdogEntry(process,
+                              self.soft_signal if soft_signal is None else soft_signal,
+                              self.grace if grace is None else grace)
+        with self._condition:
+            self._start()
+            self._push(time.monotonic() + timeout, entry)
+            self._condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        """
+        Stop watching the process of entry
+        """
+        with self._condition:
+            if entry.process is None:
+                return
+            entry.process = None
+            self._num_cancelled += 1
+            if self._num_cancelled > len(self._heap) // 2:
+                self._heap = [item for item in self._heap if item[2].process is not None]
+                heapq.heapify(self._heap)
+                self._num_cancelled = 0
+
+    def _push(self, deadline, entry):
+        heapq.heappush(self._heap, (deadline, next(self._counter), entry))
+
+    def _start(self):
+        """
+        Lazily start the watchdog thread
+        """
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, name="Watchdog")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        """
+        The body of the watchdog thread
+        """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, entry = heapq.heappop(self._heap)
+                    if entry.process is None:
+                        self._num_cancelled = max(self._num_cancelled - 1, 0)
+                    else:
+                        self._expire(entry, now)
+
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._condition.wait(timeout)
+
+    def _expire(self, entry, now):
+        """
+        Signal the process of an entry whose deadline passed
+        """
+        if not entry.expired and entry.soft_signal and entry.grace:
+            LOGGER.debug("Watchdog: deadline passed, sending signal %i to pid=%i",
+                         entry.soft_signal, entry.process.pid)
+            entry.expired = True
+            entry.process.send_signal(entry.soft_signal)
+            self._push(now + entry.grace, entry)
+            return
+
+        LOGGER.debug("Watchdog: killing pid=%i", entry.process.pid)
+        entry.expired = True
+        entry.process.send_signal(signal.SIGKILL)
+        entry.process = None
 
-            self._queue.put(string)
-        self._queue.put(None)
 
-    def eof(self):
-        """Check whether there is no more content to expect."""
-        return not self.is_alive() and self._queue.empty()
+WATCHDOG = Watchdog()
 
 
 def read_file(file_name, encoding="utf-8", newline=None):
@@ -348,3 +854,97 @@ def simplify_path(path):
         return relpath(path, cwd)
 
     return path
+
+
+class FileFollower(object):
+    """
+    Follow a file which is being written by another process like 'tail -F'
+    and return the complete lines appended since the previous read.
+    The file is reopened when it is truncated or replaced.
+
+    The file is read in chunks of READ_SIZE bytes and lines longer than
+    MAX_LINE_LENGTH bytes are truncated, memory usage is bounded no
+    matter how large the file grows.
+    """
+
+    READ_SIZE = 1024 * 1024
+    MAX_LINE_LENGTH = 64 * 1024
+
+    def __init__(self, file_name, encoding="utf-8"):
+        self._file_name = file_name
+        self._encoding = encoding
+        self._fptr = None
+        self._inode = None
+        self._buffer = b""
+        self._truncating = False
+
+    def _reopen_if_needed(self):
+        """
+        Open the file when it appears and reopen it when it was replaced or truncated
+        """
+        try:
+            stat = os.stat(self._file_name)
+        except OSError:
+            return
+
+        if self._fptr is not None:
+            if stat.st_ino == self._inode and stat.st_size >= self._fptr.tell():
+                return
+            self._fptr.close()
+
+        self._fptr = io.open(self._file_name, "rb")
+        self._inode = os.fstat(self._fptr.fileno()).st_ino
+        self._buffer = b""
+        self._truncating = False
+
+    def read_lines(self, final=False):
+        """
+        Generate the complete lines appended since the previous call,
+        when final is set the last line is returned even without newline
+        """
+        self._reopen_if_needed()
+        if self._fptr is None:
+            return
+
+        while True:
+            chunk = self._fptr.read(self.READ_SIZE)
+            if not chunk:
+                break
+
+            end = chunk.rfind(b"\n") + 1
+            if end == 0:
+                self._append(chunk)
+                continue
+
+            head = chunk[:end]
+            if self._truncating:
+                # Drop the remainder of an overlong line
+                head = head[head.find(b"\n") + 1:]
+                self._truncating = False
+            data = self._buffer + head
+            self._buffer = b""
+            self._append(chunk[end:])
+            for line in data.decode(self._encoding, errors="ignore").splitlines():
+                yield line[:self.MAX_LINE_LENGTH]
+
+        if final and self._buffer:
+            for line in self._buffer.decode(self._encoding, errors="ignore").splitlines():
+                yield line[:self.MAX_LINE_LENGTH]
+            self._buffer = b""
+            self._truncating = False
+
+    def _append(self, data):
+        """
+        Append data to the incomplete last line keeping at most MAX_LINE_LENGTH bytes
+        """
+        if self._truncating:
+            return
+        self._buffer += data
+        if len(self._buffer) > self.MAX_LINE_LENGTH:
+            self._buffer = self._buffer[:self.MAX_LINE_LENGTH] + b"\n"
+            self._truncating = True
+
+    def close(self):
+        if self._fptr is not None:
+            self._fptr.close()
+            self._fptr = None
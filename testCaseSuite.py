@@ -18,27 +18,57 @@
 import os
 import sys
 import ostools
-from test_report import (PASSED, WARNED, FAILED)
+from test_report import (PASSED, WARNED, FAILED, CANCELLED)
+from tracing import TRACER
 from globals import *
 
+# Seconds between two reads of the simulation log while simulating
+LOG_CHECK_INTERVAL = 1.0
+
 class testcaseSuite(object):
     """
     A test case to be run in an independent simulation
     """
-    def __init__(self, testsWordDir, simCmd, simulator_if):
+    def __init__(self, testsWordDir, simCmd, simulator_if, annotations=None):
         self._dir = testsWordDir
         self._simCmd = simCmd
         self._test = os.path.basename(testsWordDir)
         self.name = os.path.basename(testsWordDir)
+        # group.cfg annotations of the test, such as mem
+        self.annotations = annotations or {}
         self._run = TestRun(simulator_if=simulator_if,
                             testWordDir=self._dir,
                             simCmd = self._simCmd,
                             test_cases=[self._test])
 
+    def set_timeout(self, timeout, source=None):
+        """
+        Set the simulation timeout in seconds, None for the simulator default,
+        source tells where it comes from when the timeout expires
+        """
+        self._run.timeout = timeout
+        self._run.timeout_source = source
+
+    @property
+    def timeout(self):
+        return self._run.timeout
+
+    @property
+    def work_dir(self):
+        return self._dir
+
+    @property
+    def sim_cmd(self):
+        return self._simCmd
+
     @property
     def test_result_file(self):
         return self._run.get_test_result()
 
+    @property
+    def transcript_file(self):
+        return self._run.get_transcript()
+
     @property
     def test_information(self):
         """
@@ -53,6 +83,12 @@ class testcaseSuite(object):
         results = self._run.run(*args, **kwargs)
         return results
 
+    def collect(self):
+        """
+        Return the results of the test case simulated elsewhere, such as on LSF
+        """
+        return self._run.collect()
+
 class TestRun(object):
     """
     A single simulation run yielding the results for one or several test cases
@@ -63,6 +99,9 @@ class TestRun(object):
         self._testWordDir = testWordDir
         self._simCmd = simCmd
         self._test_cases = test_cases
+        # Simulation timeout in seconds, None for simulator_if.sim_timeout
+        self.timeout = None
+        self.timeout_source = None
 
     def set_test_cases(self, test_cases):
         self._test_cases = test_cases
@@ -70,10 +109,17 @@ class TestRun(object):
     def get_test_result(self):
         return get_result_file_name(self._testWordDir)
 
-    def run(self):
+    def get_transcript(self):
+        return get_transcript_file_name(self._testWordDir)
+
+    def run(self, output=None, cancel=None):
         """
         Run selected test cases within the test suite
 
+        :param output: File receiving the simulator stdout/stderr,
+          None to consume it through a pipe
+        :param cancel: threading.Event which kills the simulation when set,
+          the test cases are then cancelled
         Returns a dictionary of test results
         """
         results = {}
@@ -82,12 +128,60 @@ class TestRun(object):
             results[name]['reasonMsg'] = ''
             results[name]['status'] = FAILED
 
+        # Cancelled while waiting for a worker or admission, do not launch
+        if cancel is not None and cancel.is_set():
+            return self._cancel_results(results)
+
         # Ensure result file exists
         ostools.write_file(get_result_file_name(self._testWordDir), "")
 
-        sim_ok = self._simulate()
+        checker = self._create_checker()
+        follower = ostools.FileFollower(get_result_file_name(self._testWordDir))
+        # Nothing after the simulation end pattern needs to be read
+        ended = False
+        cancelled = False
 
-        results = self._read_test_results(file_name=get_result_file_name(self._testWordDir))
+        def monitor():
+            """
+            Check the log lines written so far while simulating,
+            returns True to abort the simulation on a fatal error
+            or when cancelled
+            """
+            nonlocal ended, cancelled
+            if cancel is not None and cancel.is_set():
+                cancelled = True
+                return True
+            if not ended:
+                ended = self._check_lines(checker, follower.read_lines())
+            if self._simulator_if.abort_on_fatal and checker.fatal:
+                return True
+
+        test_name = os.path.basename(self._testWordDir)
+        usage = {}
+        timeout = self.timeout if self.timeout is not None else self._simulator_if.sim_timeout
+        try:
+            try:
+                self._simulate(output, monitor, usage)
+            finally:
+                TRACER.add_phases(self._testWordDir, 'sim', test=test_name)
+            with TRACER.span('final log check', 'sim', test=test_name):
+                if not ended:
+                    self._check_lines(checker, follower.read_lines(final=True))
+        finally:
+            follower.close()
+
+        if cancelled:
+            return self._cancel_results(results)
+
+        # Set by the watchdog of the simulation, see run_command
+        timed_out = usage.pop('timed_out', False)
+        results = self._read_test_results(checker)
+        for name in results:
+            results[name]['usage'] = usage
+            if timed_out:
+                results[name]['status'] = FAILED
+                results[name]['reasonMsg'] = ('Killed by the %.0f seconds timeout (%s)'
+                                              % (timeout, self.timeout_source or '-sim_timeout'))
 
         # Do not run post check unless all passed
         for status in results.values():
@@ -100,18 +194,61 @@ class TestRun(object):
 
         return results
 
-    def _simulate(self):
+    def collect(self):
+        """
+        Check the log of a simulation which was not run by run,
+        returns a dictionary of test results
+        """
+        checker = self._create_checker()
+        follower = ostools.FileFollower(get_result_file_name(self._testWordDir))
+        try:
+            self._check_lines(checker, follower.read_lines(final=True))
+        finally:
+            follower.close()
+        return self._read_test_results(checker)
+
+    @staticmethod
+    def _cancel_results(results):
+        for name in results:
+            results[name]['status'] = CANCELLED
+            results[name]['reasonMsg'] = 'Cancelled since another test failed'
+        return results
+
+    def _simulate(self, output=None, monitor=None, usage=None):
         """
         Run simulation
         """
 
         return self._simulator_if.simulate(
             testWordDir=self._testWordDir,
-            simCmd = self._simCmd)
+            simCmd = self._simCmd,
+            output=output,
+            monitor=monitor,
+            usage=usage,
+            timeout=self.timeout)
 
-    def _read_test_results(self, file_name):
+    def _create_checker(self):
         """
-        Read test results from yasa_results file
+        Create a simulation results checker owned by this run,
+        it follows the log while simulating so it can not be shared
+        """
+        return self._simulator_if.createSimCheck()
+
+    @staticmethod
+    def _check_lines(checker, lines):
+        """
+        Check lines until the simulation end pattern,
+        returns True when it has been seen
+        """
+        for line in lines:
+            line = line.strip()
+            if checker.check(line):
+                return True
+        return False
+
+    def _read_test_results(self, checker):
+        """
+        Read test results from the checker which has seen the whole log
         """
         results = {}
         for name in self._test_cases:
@@ -119,32 +256,6 @@ class TestRun(object):
             results[name]['reasonMsg'] = ''
             results[name]['status'] = FAILED
 
-        if not ostools.file_exists(file_name):
-            return results
-
-        test_results = ostools.read_file(file_name)
-
-        (userSimCheckFunc, userSimCheckFile) = userSimCheck()
-        if userSimCheckFile:
-            sys.path.append(os.path.dirname(userSimCheckFile))
-            from userSimCheck import userSimCheck as simCheck
-            checker=simCheck()
-        else:
-            checker= self._simulator_if.simCheck
-        #elif self._simulator_if.name =='vcs':
-        #    from Simulator.vcsInterface import vcsSimCheck
-        #    checker=vcsSimCheck()
-        #elif self._simulator_if.name =='irun':
-        #    from Simulator.incisiveInterface import irunSimCheck 
-        #    checker=irunSimCheck()
-        #elif self._simulator_if.name =='xrun':
-        #    from Simulator.xceliumInterface import xrunSimCheck 
-        #    checker=xrunSimCheck()
-
-        checker.resetStatus()
-        for line in test_results.splitlines():
-            line = line.strip()
-            checker.check(line)
         status, reasonMsg = checker.status
 
         for test_name in self._test_cases:
@@ -165,3 +276,6 @@ class TestRun(object):
 
 def get_result_file_name(output_path):
     return os.path.join(output_path, "sim.log")
+
+def get_transcript_file_name(output_path):
+    return os.path.join(output_path, "sim.transcript")
@@ -0,0 +1,186 @@
+#******************************************************************************
+# * Copyright (c) 2019, XtremeDV. All rights reserved.
+# *
+# * Licensed under the Apache License, Version 2.0 (the "License");
+# * you may not use this file except in compliance with the License.
+# * You may obtain a copy of the License at
+# *
+# * http://www.apache.org/licenses/LICENSE-2.0
+# *
+# * Unless required by applicable law or agreed to in writing, software
+# * distributed under the License is distributed on an "AS IS" BASIS,
+# * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# * See the License for the specific language governing permissions and
+# * limitations under the License.
+# *
+# * Author: Jude Zhang, Email: zhajio.1988@gmail.com
+# *******************************************************************************
+"""
+Persistent history of test results
+"""
+
+import math
+import socket
+import time
+
+
+class TestHistory(object):
+    """
+    Store the results of every test run in a database so that later runs
+    can use runtime and failure statistics.
+
+    The results of a test are kept as one record keyed by build and test
+    name without the seed. A record holds the latest runs and statistics
+    which are updated when a result is added, so queries read a single record
+    """
+    MAX_RUNS = 100
+    # Runs needed before the runtime history sets the timeout of a test
+    MIN_TIMEOUT_RUNS = 3
+    # Shortest timeout derived from the runtime history, in seconds
+    MIN_TIMEOUT = 60.0
+
+    def __init__(self, database, max_runs=MAX_RUNS):
+        """
+        - database is a PickledDataBase
+        - max_runs is the number of latest runs kept for each test
+        """
+        self._database = database
+        self._max_runs = max_runs
+
+    @staticmethod
+    def split_seed(test_name):
+        """
+        Split a testcase dir name like group__test__seed into the
+        test name and the seed
+        """
+        name, sep, seed = test_name.rpartition('__')
+        if sep and seed.isdigit():
+            return name, seed
+        return test_name, None
+
+    @staticmethod
+    def _key(build, name):
+        return ("history/%s/%s" % (build, name)).encode()
+
+    def _read(self, build, name):
+        key = self._key(build, name)
+        if key in self._database:
+            return self._database[key]
+        return None
+
+    def add_result(self, build, test_name, status, time_taken, fail_message='', host=None, usage=None):
+        """
+        Add the result of one test run, test_name includes the seed,
+        usage is the resource usage of the simulation when known
+        """
+        name, seed = self.split_seed(test_name)
+        run = {'seed': seed,
+               'status': status.name,
+               'time': time_taken,
+               'fail_message': fail_message,
+               'host': host or socket.gethostname(),
+               'date': time.time(),
+               'usage': usage or {}}
+
+        # Other YASA processes may add results of the same test
+        with self._database.transaction():
+            record = self._read(build, name) or {'runs': []}
+            runs = record['runs']
+            runs.append(run)
+            del runs[:-self._max_runs]
+            record['statistics'] = TestStatistics.from_runs(runs)
+            self._database[self._key(build, name)] = record
+
+    def add_report(self, build, report):
+        """
+        Add all results of a TestReport in one transaction, cancelled
+        tests did not run to completion and are left out
+        """
+        host = socket.gethostname()
+        with self._database.transaction():
+            for result in report.results():
+                if result.cancelled:
+                    continue
+                self.add_result(build, result.name, result.status, result.time, result.fail_message, host,
+                                result.usage)
+
+    def runs(self, build, name):
+        """
+        Return the latest runs of test name, oldest first
+        """
+        record = self._read(build, name)
+        return list(record['runs']) if record else []
+
+    def expected_time(self, build, test_name):
+        """
+        Return the mean runtime of test_name, which may include the seed,
+        or None when it never ran
+        """
+        statistics = self.statistics(build, self.split_seed(test_name)[0])
+        return statistics.mean_time if statistics else None
+
+    def expected_memory(self, build, test_name):
+        """
+        Return the peak memory in MB of the latest runs of test_name,
+        which may include the seed, or None when unknown
+        """
+        statistics = self.statistics(build, self.split_seed(test_name)[0])
+        return statistics.peak_rss_mb if statistics else None
+
+    def timeout(self, build, test_name, scale, cap):
+        """
+        Return the simulation timeout of test_name, which may include the seed,
+        scale times the p95 runtime of its latest runs, at least MIN_TIMEOUT
+        and at most cap. The timeout is cap when fewer than MIN_TIMEOUT_RUNS
+        are known. Returns the timeout and a description of where it comes from
+        """
+        statistics = self.statistics(build, self.split_seed(test_name)[0])
+        if statistics is None or statistics.num_runs < self.MIN_TIMEOUT_RUNS:
+            return cap, 'timeout cap, too few runs in the test history'
+        timeout = scale * statistics.p95_time
+        if timeout >= cap:
+            return cap, 'timeout cap'
+        description = '%g x p95 runtime %.1f seconds' % (scale, statistics.p95_time)
+        if timeout < self.MIN_TIMEOUT:
+            return self.MIN_TIMEOUT, 'shortest history timeout, ' + description
+        return timeout, description
+
+    def statistics(self, build, name):
+        """
+        Return the TestStatistics of test name or None when it never ran
+        """
+        record = self._read(build, name)
+        return record['statistics'] if record else None
+
+
+class TestStatistics(object):
+    """
+    Runtime and failure statistics of the latest runs of a test
+    """
+    # Statistics stored before memory was recorded have no peak_rss_mb
+    peak_rss_mb = None
+
+    def __init__(self, num_runs, mean_time, p95_time, failure_rate, peak_rss_mb=None):
+        self.num_runs = num_runs
+        self.mean_time = mean_time
+        self.p95_time = p95_time
+        self.failure_rate = failure_rate
+        self.peak_rss_mb = peak_rss_mb
+
+    @classmethod
+    def from_runs(cls, runs):
+        times = sorted(run['time'] for run in runs)
+        num_failed = sum(1 for run in runs if run['status'] == 'failed')
+        # Nearest rank percentile
+        p95_time = times[max(int(math.ceil(0.95 * len(times))) - 1, 0)]
+        rss = [run['usage']['max_rss_mb'] for run in runs if run.get('usage')]
+        return cls(num_runs=len(runs),
+                   mean_time=sum(times) / len(times),
+                   p95_time=p95_time,
+                   failure_rate=float(num_failed) / len(runs),
+                   peak_rss_mb=max(rss) if rss else None)
+
+    def __repr__(self):
+        peak_rss = "%.0f" % self.peak_rss_mb if self.peak_rss_mb is not None else "None"
+        return ("TestStatistics(num_runs=%i, mean_time=%.1f, p95_time=%.1f, failure_rate=%.2f, peak_rss_mb=%s)"
+                % (self.num_runs, self.mean_time, self.p95_time, self.failure_rate, peak_rss))
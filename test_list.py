@@ -46,6 +46,21 @@ class TestList(object):
         self._test_suites = [test for test in self._test_suites
                              if test.keep_matches(test_filter)]
 
+    def sort_longest_first(self, expected_time):
+        """
+        Order the test suites by expected runtime, longest first, so that
+        long tests do not start last and stretch the total run time.
+        expected_time returns the expected runtime of a suite or None when
+        unknown, unknown suites are assumed to take the mean known runtime.
+        The sort is stable, suites with equal runtime keep their order
+        """
+        expected = [expected_time(test_suite) for test_suite in self._test_suites]
+        known = [value for value in expected if value is not None]
+        default = sum(known) / len(known) if known else 0.0
+        order = sorted(range(len(self._test_suites)),
+                       key=lambda idx: -(default if expected[idx] is None else expected[idx]))
+        self._test_suites = [self._test_suites[idx] for idx in order]
+
     @property
     def num_tests(self):
         """
@@ -95,6 +110,29 @@ class TestSuiteWrapper(object):
     def test_result_file(self):
         return self._test_case.test_result_file
 
+    @property
+    def transcript_file(self):
+        return self._test_case.transcript_file
+
+    @property
+    def annotations(self):
+        return self._test_case.annotations
+
+    def set_timeout(self, timeout, source=None):
+        self._test_case.set_timeout(timeout, source)
+
+    @property
+    def timeout(self):
+        return self._test_case.timeout
+
+    @property
+    def work_dir(self):
+        return self._test_case.work_dir
+
+    @property
+    def sim_cmd(self):
+        return self._test_case.sim_cmd
+
     @property
     def test_information(self):
         return {self.name: self._test_case.test_information}
@@ -107,7 +145,13 @@ class TestSuiteWrapper(object):
         """
         Run the test suite and return the test results for all test cases
         """
-        test_ok = self._test_case.run()
+        test_ok = self._test_case.run(*args, **kwargs)
         return  test_ok
 
         #return {self._test_case.name: PASSED if test_ok else FAILED}
+
+    def collect(self):
+        """
+        Return the test results of a test suite simulated elsewhere
+        """
+        return self._test_case.collect()
@@ -23,10 +23,11 @@ Provide test reporting functionality
 from xml.etree import ElementTree
 from sys import version_info
 import os
+import sys
 import socket
 import re
 from color_printer import COLOR_PRINTER
-from ostools import read_file
+from ostools import read_file, get_time
 
 
 class TestReport(object):
@@ -36,10 +37,19 @@ class TestReport(object):
     def __init__(self, printer=COLOR_PRINTER, filePath="./"):
         self._test_results = {}
         self._test_names_in_order = []
+        # Results per status are kept up to date as they are added so
+        # that printing the status after each test does not walk all results
+        self._passed = []
+        self._failures = []
+        self._warned = []
+        self._cancelled = []
         self._printer = printer
         self._filePath = filePath
         self._real_total_time = 0.0
         self._expected_num_tests = 0
+        self._start_time = get_time()
+        self._last_progress_time = None
+        self._progress_pending = False
         self.fp = open(os.path.join(self._filePath, "test_status.hud"), "w+", encoding="utf-8")
         self.fp.write("HVP metric = test\n")
 
@@ -66,8 +76,25 @@ class TestReport(object):
         Add a a test result
         """
         result = TestResult(*args, **kwargs)
+        if result.name in self._test_results:
+            old_result = self._test_results[result.name]
+            self._results_with_status(old_result).remove(old_result)
+            self._test_names_in_order.remove(result.name)
         self._test_results[result.name] = result
         self._test_names_in_order.append(result.name)
+        self._results_with_status(result).append(result)
+
+    def _results_with_status(self, result):
+        """
+        Return the list of results having the same status as result
+        """
+        if result.passed:
+            return self._passed
+        elif result.failed:
+            return self._failures
+        elif result.cancelled:
+            return self._cancelled
+        return self._warned
 
     def _last_test_result(self):
         """
@@ -75,6 +102,12 @@ class TestReport(object):
         """
         return self._test_results[self._test_names_in_order[-1]]
 
+    def results(self):
+        """
+        Return the test results in the order they were added
+        """
+        return self._test_results_in_order()
+
     def _test_results_in_order(self):
         """
         Return the test results in the order they were added
@@ -88,38 +121,113 @@ class TestReport(object):
         total number of passed, failed and warned tests
         """
         result = self._last_test_result()
-        passed, failed, warned = self._split()
+        self._write_hud(result)
         if result.passed:
             self._printer.write("pass", fg='gi')
-            self.fp.write("%s = pass\n" % result.name)
         elif result.failed:
             self._printer.write("fail", fg='ri')
-            self.fp.write("%s = fail\n" % result.name)
         elif result.warned:
             self._printer.write("warn", fg='rgi')
-            self.fp.write("%s = warn\n" % result.name)            
-        else:
-            self.fp.write("%s = unknown\n" % result.name)
-            assert False
+        elif result.cancelled:
+            self._printer.write("cancelled", fg='rgi')
 
-        args = []
-        args.append("P=%i" % len(passed))
-        args.append("W=%i" % len(warned))
-        args.append("F=%i" % len(failed))
-        args.append("T=%i" % total_tests)
+        args = self._status_args(total_tests)
+        time_str = "%.1f seconds" % result.time
+        if result.usage:
+            time_str += ", " + result.usage_str
 
         if result.fail_message != '':
-            self._printer.write(" (%s) %s (%.1f seconds)\n    FailMsg: %s\n    LogFile: %s" %
-                            (" ".join(args), result.name, result.time, result.fail_message, result.log_file))
+            self._printer.write(" (%s) %s (%s)\n    FailMsg: %s\n    LogFile: %s" %
+                            (" ".join(args), result.name, time_str, result.fail_message, result.log_file))
+        else:
+            self._printer.write(" (%s) %s (%s)\n    LogFile: %s" %
+                            (" ".join(args), result.name, time_str, result.log_file))            
+
+    def print_progress(self, total_tests, min_interval=0.25, redraw=True):
+        """
+        Print the total number of passed, failed and warned tests, the
+        throughput and the estimated time left on a single line which is
+        redrawn at most once every min_interval seconds. The details of the
+        last test run are only printed when it failed or warned.
+        When redraw is False every update is printed on a new line
+        """
+        result = self._last_test_result()
+        if result.passed or result.cancelled:
+            self._write_hud(result)
+        else:
+            self._clear_progress()
+            self.print_latest_status(total_tests)
+            self._printer.write("\n")
+
+        now = get_time()
+        if (not result.passed
+                or len(self._test_results) >= total_tests
+                or self._last_progress_time is None
+                or now - self._last_progress_time >= min_interval):
+            self._last_progress_time = now
+            self._write_progress(total_tests, now, redraw)
+
+    def end_progress(self):
+        """
+        Terminate the progress line
+        """
+        if self._progress_pending:
+            self._printer.write("\n")
+            self._progress_pending = False
+
+    def _clear_progress(self):
+        if self._progress_pending:
+            self._printer.write("\r\033[K")
+            self._progress_pending = False
+
+    def _write_progress(self, total_tests, now, redraw):
+        """
+        Write the progress line
+        """
+        num_done = len(self._test_results)
+        elapsed = now - self._start_time
+        rate = num_done / elapsed if elapsed > 0 else 0.0
+        if rate > 0:
+            eta = _format_duration((total_tests - num_done) / rate)
+        else:
+            eta = "?"
+
+        self._clear_progress()
+        self._printer.write("%s (%i of %i) %.2f tests/s ETA %s" %
+                            (" ".join(self._status_args(total_tests)[:3]), num_done, total_tests, rate, eta))
+        if redraw:
+            self._progress_pending = True
+        else:
+            self._printer.write("\n")
+        sys.stdout.flush()
+
+    def _status_args(self, total_tests):
+        return ["P=%i" % len(self._passed),
+                "W=%i" % len(self._warned),
+                "F=%i" % len(self._failures),
+                "T=%i" % total_tests]
+
+    def _write_hud(self, result):
+        """
+        Write the status of result to the test status hud file
+        """
+        if result.passed:
+            self.fp.write("%s = pass\n" % result.name)
+        elif result.failed:
+            self.fp.write("%s = fail\n" % result.name)
+        elif result.warned:
+            self.fp.write("%s = warn\n" % result.name)
+        elif result.cancelled:
+            self.fp.write("%s = cancelled\n" % result.name)
         else:
-            self._printer.write(" (%s) %s (%.1f seconds)\n    LogFile: %s" %
-                            (" ".join(args), result.name, result.time, result.log_file))            
+            self.fp.write("%s = unknown\n" % result.name)
+            assert False
 
     def all_ok(self):
         """
         Return true if all test passed
         """
-        return all(test_result.passed for test_result in self._test_results.values())
+        return len(self._passed) == len(self._test_results)
 
     def has_test(self, test_name):
         return test_name in self._test_results
@@ -132,8 +240,8 @@ class TestReport(object):
         Print the report as a colored string
         """
 
-        passed, failures, warned = self._split()
-        all_tests = passed + warned + failures
+        passed, failures, warned, cancelled = self._split()
+        all_tests = passed + warned + failures + cancelled
 
         if not all_tests:
             self._printer.write("No tests were run!", fg="rgi")
@@ -162,6 +270,10 @@ class TestReport(object):
         if n_failed > 0:
             self._printer.write("fail", fg='ri')
             self._printer.write(" %i of %i\n" % (n_failed, total))
+
+        if cancelled:
+            self._printer.write("cancelled", fg='rgi')
+            self._printer.write(" %i of %i\n" % (len(cancelled), total))
         self._printer.write("%s\n" % ("=" * (max(max_len + 25, 0))))
 
         total_time = sum((result.time for result in self._test_results.values()))
@@ -187,32 +299,22 @@ class TestReport(object):
 
     def _split(self):
         """
-        Split the test cases into passed and failures
+        Split the test cases into passed, failures, warned and cancelled
         """
-        failures = []
-        passed = []
-        warned = []
-        for result in self._test_results_in_order():
-            if result.passed:
-                passed.append(result)
-            elif result.failed:
-                failures.append(result)
-            elif result.warned:
-                warned.append(result)
-
-        return passed, failures, warned
+        return list(self._passed), list(self._failures), list(self._warned), list(self._cancelled)
 
     def to_junit_xml_str(self, xunit_xml_format='jenkins'):
         """
         Convert test report to a junit xml string
         """
-        _, failures, warned = self._split()
+        _, failures, warned, cancelled = self._split()
 
         root = ElementTree.Element("testsuite")
         root.attrib["name"] = "testsuite"
         root.attrib["errors"] = "0"
         root.attrib["failures"] = str(len(failures))
         root.attrib["warned"] = str(len(warned))
+        root.attrib["skipped"] = str(len(cancelled))
         root.attrib["tests"] = str(len(self._test_results))
         root.attrib["hostname"] = socket.gethostname()
 
@@ -228,6 +330,15 @@ class TestReport(object):
         return xml
 
 
+def _format_duration(seconds):
+    """
+    Format seconds as h:mm:ss
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "%i:%02i:%02i" % (hours, minutes, seconds)
+
+
 class TestStatus(object):
     """
     The status of a test
@@ -248,6 +359,8 @@ class TestStatus(object):
 PASSED = TestStatus("passed")
 WARNED = TestStatus("warned")
 FAILED = TestStatus("failed")
+# The simulation was stopped since another test failed, see -fail-fast
+CANCELLED = TestStatus("cancelled")
 
 class TestResult(object):
     """
@@ -257,7 +370,8 @@ class TestResult(object):
     def __init__(self, name, status, time, output_file_name):
         assert status['status'] in (PASSED,
                           FAILED,
-                          WARNED)
+                          WARNED,
+                          CANCELLED)
         self.name = name
         self._status = status
         self.time = time
@@ -282,10 +396,33 @@ class TestResult(object):
         else:
             return "Error, %s not exists" % self._output_file_name
 
+    @property
+    def status(self):
+        return self._status['status']
+
     @property
     def fail_message(self):
         return self._status['reasonMsg'] 
 
+    @property
+    def usage(self):
+        """
+        Return the resources used by the simulation, a dictionary with
+        max_rss_mb, user_time, sys_time, read_bytes and write_bytes,
+        empty when unknown
+        """
+        return self._status.get('usage') or {}
+
+    @property
+    def usage_str(self):
+        """
+        Return a short description of the resources used, empty when unknown
+        """
+        usage = self.usage
+        if not usage:
+            return ''
+        return "%.0f MB, %.1fs cpu" % (usage['max_rss_mb'], usage['user_time'] + usage['sys_time'])
+
     @property
     def passed(self):
         return self._status['status'] == PASSED
@@ -298,6 +435,10 @@ class TestResult(object):
     def failed(self):
         return self._status['status'] == FAILED
 
+    @property
+    def cancelled(self):
+        return self._status['status'] == CANCELLED
+
     def print_status(self, printer, padding=0):
         """
         Print the status and runtime of this test result
@@ -311,10 +452,16 @@ class TestResult(object):
         elif self.warned:
             printer.write("warn", fg='rgi')
             printer.write(" ")
+        elif self.cancelled:
+            printer.write("cancelled", fg='rgi')
+            printer.write(" ")
 
         my_padding = max(padding - len(self.name), 0)
 
-        printer.write("%s (%.1f seconds)\n" % (self.name + (" " * my_padding), self.time))
+        if self.usage:
+            printer.write("%s (%.1f seconds, %s)\n" % (self.name + (" " * my_padding), self.time, self.usage_str))
+        else:
+            printer.write("%s (%.1f seconds)\n" % (self.name + (" " * my_padding), self.time))
 
     def to_xml(self, xunit_xml_format):
         """
@@ -330,6 +477,13 @@ class TestResult(object):
 
         test.attrib["time"] = "%.1f" % self.time
 
+        if self.usage:
+            properties = ElementTree.SubElement(test, "properties")
+            for name in sorted(self.usage):
+                prop = ElementTree.SubElement(properties, "property")
+                prop.attrib["name"] = name
+                prop.attrib["value"] = str(self.usage[name])
+
         # By default the output is stored in system-out
         system_out = ElementTree.SubElement(test, "system-out")
         #system_out.text = self.output
@@ -347,4 +501,8 @@ class TestResult(object):
         elif self.warned:
             warned = ElementTree.SubElement(test, "warning")
             warned.attrib["message"] = self.fail_message 
+
+        elif self.cancelled:
+            skipped = ElementTree.SubElement(test, "skipped")
+            skipped.attrib["message"] = self.fail_message
         return test
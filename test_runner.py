@@ -31,10 +31,12 @@ import sys
 import time
 import logging
 import string
+import shutil
 from contextlib import contextmanager
 import ostools
 from test_report import PASSED, FAILED, WARNED
 from hashing import hash_string
+from tracing import TRACER
 
 LOGGER = logging.getLogger(__name__)
 
@@ -46,16 +48,26 @@ class TestRunner(object):
     VERBOSITY_NORMAL = 1
     VERBOSITY_VERBOSE = 2
 
+    SIM_OUTPUT_PIPE = "pipe"
+    SIM_OUTPUT_FILE = "file"
+    SIM_OUTPUT_NULL = "null"
+
     def __init__(self,
                  report,
                  verbosity=VERBOSITY_NORMAL,
                  num_threads=1,
                  fail_fast=False,
                  dont_catch_exceptions=False,
-                 no_color=False):
+                 no_color=False,
+                 sim_output=SIM_OUTPUT_PIPE,
+                 progress=None,
+                 admission=None):
         self._lock = threading.Lock()
         self._fail_fast = fail_fast
         self._abort = False
+        # Set to cancel the simulations in flight, see -fail-fast
+        self._cancel = threading.Event()
+        self._scheduler = None
         self._local = threading.local()
         self._report = report
         assert verbosity in (self.VERBOSITY_QUIET,
@@ -67,6 +79,15 @@ class TestRunner(object):
         self._stderr = sys.stderr
         self._dont_catch_exceptions = dont_catch_exceptions
         self._no_color = no_color
+        assert sim_output in (self.SIM_OUTPUT_PIPE,
+                              self.SIM_OUTPUT_FILE,
+                              self.SIM_OUTPUT_NULL)
+        self._sim_output = sim_output
+        # Number of progress line redraws per second, None for the full status of every test
+        self._progress = progress
+        self._redraw_progress = getattr(self._stdout, "isatty", lambda: False)()
+        # AdmissionControl delaying tests which do not fit the host, None to start them right away
+        self._admission = admission
 
         ostools.PROGRAM_STATUS.reset()
 
@@ -78,6 +99,10 @@ class TestRunner(object):
     def _is_quiet(self):
         return self._verbosity == self.VERBOSITY_QUIET
 
+    @property
+    def _show_progress(self):
+        return self._progress is not None
+
     def run(self, test_suites):
         """
         Run a list of test suites
@@ -97,11 +122,12 @@ class TestRunner(object):
         self._report.set_expected_num_tests(num_tests)
 
         scheduler = TestScheduler(test_suites)
+        self._scheduler = scheduler
 
         threads = []
 
         # Disable continuous output in parallel mode
-        write_stdout = self._is_verbose and self._num_threads == 1
+        write_stdout = self._is_verbose and self._num_threads == 1 and not self._show_progress
 
         try:
             sys.stdout = ThreadLocalOutput(self._local, self._stdout)
@@ -118,7 +144,9 @@ class TestRunner(object):
             # Run one worker in main thread such that P=1 is not multithreaded
             self._run_thread(write_stdout, scheduler, num_tests, True)
 
-            scheduler.wait_for_finish()
+            # No test left to start, the last ones still run in other workers
+            with TRACER.span('tail wait', 'scheduler'):
+                scheduler.wait_for_finish()
 
         except KeyboardInterrupt:
             LOGGER.debug("TestRunner: Caught Ctrl-C shutting down")
@@ -130,6 +158,9 @@ class TestRunner(object):
                 thread.join()
             threading.stack_size(0)            
 
+            if self._show_progress:
+                self._report.end_progress()
+
             sys.stdout = self._stdout
             sys.stderr = self._stderr
             LOGGER.debug("TestRunner: Leaving")
@@ -142,12 +173,19 @@ class TestRunner(object):
 
         while True:
             test_suite = None
+            admitted = False
             try:
                 test_suite = scheduler.next()
 
+                if self._admission is not None:
+                    with TRACER.span('admission wait', 'scheduler', test=test_suite.name):
+                        self._admission.acquire(test_suite)
+                    admitted = True
+
                 with self._stdout_lock():
                     for test_name in test_suite.test_names:
-                        print("Starting %s" % test_name)
+                        if not self._show_progress:
+                            print("Starting %s" % test_name)
                     #print("Output file: %s" % test_suite.test_result_file)
 
                 self._run_test_suite(test_suite,
@@ -166,6 +204,8 @@ class TestRunner(object):
                 return
 
             finally:
+                if admitted:
+                    self._admission.release(test_suite)
                 if test_suite is not None:
                     scheduler.test_done()
 
@@ -206,7 +246,8 @@ class TestRunner(object):
                 self._local.output = devNull
                 #self._local.output = Tee([devNull])
 
-            results = test_suite.run()
+            results = test_suite.run(output=self._sim_output_file(test_suite, write_stdout),
+                                     cancel=self._cancel)
 
         except KeyboardInterrupt:
             self._add_skipped_tests(test_suite, results, start_time, num_tests, test_suite.test_result_file)
@@ -229,30 +270,63 @@ class TestRunner(object):
             #    fptr.flush()
             #    fptr.close()
 
+        self._suite_done(test_suite, results, start_time, num_tests, write_stdout)
+
+    def _suite_done(self, test_suite, results, start_time, num_tests, write_stdout=False):
+        """
+        Print the output of a test suite when needed and add its results,
+        aborts the run on a failure with fail fast
+        """
         any_not_passed = any(value['status'] != PASSED for value in results.values())
 
         with self._stdout_lock():
-            if (any_not_passed or self._is_verbose) and not self._is_quiet and not write_stdout:
+            show_output = self._is_verbose or (any_not_passed and not self._show_progress)
+            if show_output and not self._is_quiet and not write_stdout:
                 #use stdout, print log file contents in terminal.
                 self._print_output(test_suite.test_result_file)
 
             self._add_results(test_suite, results, start_time, num_tests, test_suite.test_result_file)
 
-            if self._fail_fast and any_not_passed:
-                self._abort = True
+            if self._fail_fast and any_not_passed and not self._abort:
+                self._abort_run()
+
+    def _abort_run(self):
+        """
+        Start no more tests and cancel the simulations in flight,
+        they are reported as cancelled
+        """
+        LOGGER.debug("TestRunner: Failure with fail fast, cancelling the running tests")
+        self._abort = True
+        self._scheduler.abort()
+        self._cancel.set()
+
+    def _sim_output_file(self, test_suite, write_stdout):
+        """
+        Return the file receiving the simulator stdout/stderr directly,
+        None when it must be consumed through a pipe.
+        Output is only piped through Python when it is actually shown
+        """
+        if write_stdout or self._sim_output == self.SIM_OUTPUT_PIPE:
+            return None
+        elif self._sim_output == self.SIM_OUTPUT_FILE:
+            return test_suite.transcript_file
+        return os.devnull
 
     def _print_output(self, output_file_name):
         """
         Print contents of output file if it exists
         """
-        with open(output_file_name, "r") as fh:
-            for line in fh.readlines():
-                self._stdout.write(line)
+        with open(output_file_name, "r", errors="ignore") as fh:
+            shutil.copyfileobj(fh, self._stdout)
 
     def _add_results(self, test_suite, results, start_time, num_tests, output_file_name):
         """
         Add results to test report
         """
+        with TRACER.span('report update', 'report', test=test_suite.name):
+            self._add_results_to_report(test_suite, results, start_time, num_tests, output_file_name)
+
+    def _add_results_to_report(self, test_suite, results, start_time, num_tests, output_file_name):
         runtime = ostools.get_time() - start_time
         time_per_test = runtime / len(results)
 
@@ -262,8 +336,15 @@ class TestRunner(object):
                                     status,
                                     time_per_test,
                                     output_file_name)
-            self._report.print_latest_status(total_tests=num_tests)
-        print()
+            if self._show_progress:
+                self._report.print_progress(total_tests=num_tests,
+                                            min_interval=1.0 / self._progress,
+                                            redraw=self._redraw_progress)
+            else:
+                self._report.print_latest_status(total_tests=num_tests)
+
+        if not self._show_progress:
+            print()
 
     @staticmethod
     def _fail_suite(test_suite):
@@ -279,11 +360,8 @@ class TestRunner(object):
     def _stdout_lock(self):
         """
         Enter this lock when printing to stdout
-        Ensures no additional output is printed during abort
         """
         with self._lock:  # pylint: disable=not-context-manager
-            if self._abort:
-                raise KeyboardInterrupt
             yield
 
 
@@ -338,10 +416,12 @@ class TestScheduler(object):
     """
 
     def __init__(self, tests):
-        self._lock = threading.Lock()
+        self._condition = threading.Condition()
         self._tests = tests
         self._idx = 0
         self._num_done = 0
+        self._num_to_run = len(tests)
+        ostools.PROGRAM_STATUS.register(self._condition)
 
     def __iter__(self):
         return self
@@ -357,31 +437,43 @@ class TestScheduler(object):
         Iterator in Python 2
         """
         ostools.PROGRAM_STATUS.check_for_shutdown()
-        with self._lock:  # pylint: disable=not-context-manager
-            if self._idx < len(self._tests):
+        with self._condition:
+            if self._idx < self._num_to_run:
                 idx = self._idx
                 self._idx += 1
                 return self._tests[idx]
 
             raise StopIteration
 
+    def abort(self):
+        """
+        Start no more tests, the tests already started still have to be done
+        """
+        with self._condition:
+            self._num_to_run = self._idx
+            self._condition.notify_all()
+
     def test_done(self):
         """
         Signal that a test has been done
         """
-        with self._lock:  # pylint: disable=not-context-manager
+        with self._condition:
             self._num_done += 1
+            self._condition.notify_all()
 
     def is_finished(self):
-        with self._lock:  # pylint: disable=not-context-manager
-            return self._num_done >= len(self._tests)
+        with self._condition:
+            return self._num_done >= self._num_to_run
 
     def wait_for_finish(self):
         """
-        Block until all tests have been done
+        Block until all tests have been done, woken up by test_done
+        or by a shutdown instead of polling
         """
-        while not self.is_finished():
-            time.sleep(0.05)
+        with self._condition:
+            while self._num_done < self._num_to_run:
+                ostools.PROGRAM_STATUS.check_for_shutdown()
+                self._condition.wait()
 
 
 LEGAL_CHARS = string.printable
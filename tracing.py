@@ -0,0 +1,135 @@
+#******************************************************************************
+# * Copyright (c) 2019, XtremeDV. All rights reserved.
+# *
+# * Licensed under the Apache License, Version 2.0 (the "License");
+# * you may not use this file except in compliance with the License.
+# * You may obtain a copy of the License at
+# *
+# * http://www.apache.org/licenses/LICENSE-2.0
+# *
+# * Unless required by applicable law or agreed to in writing, software
+# * distributed under the License is distributed on an "AS IS" BASIS,
+# * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# * See the License for the specific language governing permissions and
+# * limitations under the License.
+# *
+# * Author: Jude Zhang, Email: zhajio.1988@gmail.com
+# *******************************************************************************
+"""
+Record how long each phase of a run takes and export it as a Chrome
+trace, which can be opened in chrome://tracing or https://ui.perfetto.dev
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Written by the generated commands in the build and testcase dirs
+PHASE_FILE = '.yasa_phases'
+
+
+class Tracer(object):
+    """
+    Collect spans, a named phase with a start and end time on a thread.
+    Nothing is recorded until enabled
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._threads = {}
+        self.enabled = False
+
+    def enable(self):
+        self.enabled = True
+
+    @contextmanager
+    def span(self, name, category='yasa', **args):
+        """
+        Record the time spent in the with block
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.time(), category, **args)
+
+    def add_span(self, name, start, end, category='yasa', **args):
+        """
+        Record a span of the calling thread, start and end are time.time() values
+        """
+        if not self.enabled:
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            if ident not in self._threads:
+                self._threads[ident] = (len(self._threads), threading.current_thread().name)
+            self._events.append({'name': name,
+                                 'cat': category,
+                                 'ph': 'X',
+                                 'ts': start * 1e6,
+                                 'dur': max(end - start, 0.0) * 1e6,
+                                 'pid': os.getpid(),
+                                 'tid': self._threads[ident][0],
+                                 'args': args})
+
+    def add_phases(self, directory, category='yasa', **args):
+        """
+        Record the phases marked by the command of phase_markers run in directory
+        """
+        for (name, start, end) in read_phases(directory):
+            self.add_span(name, start, end, category, **args)
+
+    def write(self, file_name):
+        """
+        Write the spans as Chrome trace event JSON
+        """
+        with self._lock:
+            events = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                       'args': {'name': name}}
+                      for (tid, name) in self._threads.values()]
+            events += self._events
+        with open(file_name, 'w') as fptr:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fptr)
+
+
+def phase_markers(phases, trace=True):
+    """
+    Join the (name, command) phases into one shell command which records
+    the time each phase starts in PHASE_FILE when tracing is enabled
+    """
+    if not (trace and TRACER.enabled):
+        return '; '.join(command for (_, command) in phases) + ';'
+    # Single quotes, the command may be quoted with double quotes for bsub
+    commands = ["date '+start %%s.%%N' > %s" % PHASE_FILE]
+    for (name, command) in phases:
+        commands.append("date '+%s %%s.%%N' >> %s" % (name, PHASE_FILE))
+        commands.append(command)
+    commands.append("date '+end %%s.%%N' >> %s" % PHASE_FILE)
+    return '; '.join(commands) + ';'
+
+
+def read_phases(directory):
+    """
+    Return (name, start, end) of the phases recorded in PHASE_FILE
+    """
+    markers = []
+    try:
+        with open(os.path.join(directory, PHASE_FILE), 'r') as fptr:
+            for line in fptr:
+                words = line.split()
+                if len(words) == 2:
+                    markers.append((words[0], float(words[1])))
+    except (IOError, OSError, ValueError):
+        return []
+
+    return [(name, start, next_start)
+            for ((name, start), (_, next_start)) in zip(markers, markers[1:])
+            if name != 'start']
+
+
+TRACER = Tracer()
@@ -0,0 +1,254 @@
+#******************************************************************************
+# * Copyright (c) 2019, XtremeDV. All rights reserved.
+# *
+# * Licensed under the Apache License, Version 2.0 (the "License");
+# * you may not use this file except in compliance with the License.
+# * You may obtain a copy of the License at
+# *
+# * http://www.apache.org/licenses/LICENSE-2.0
+# *
+# * Unless required by applicable law or agreed to in writing, software
+# * distributed under the License is distributed on an "AS IS" BASIS,
+# * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# * See the License for the specific language governing permissions and
+# * limitations under the License.
+# *
+# * Author: Jude Zhang, Email: zhajio.1988@gmail.com
+# *******************************************************************************
+"""
+Measure the overhead of YASA itself with the fake simulator, see
+Simulator/fakeSim.py. No simulator license is needed.
+
+    python yasaBench.py                            all benchmarks, default sizes
+    python yasaBench.py -n 1000 10000 -p 1 16      selected sizes and thread counts
+    python yasaBench.py -only scheduler report -json bench.json
+
+Micro benchmarks time the scheduler, log check, report and group.cfg
+parsing in process. The run benchmark runs yasaTop.py on a generated
+project of zero duration fake simulations and reports the wall time per test.
+Save results with -json and compare them between YASA versions to catch
+performance regressions.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import threading
+import subprocess
+
+YASA_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARKS = ['scheduler', 'log', 'report', 'config', 'run']
+
+
+def createProject(prjHome, numTests, simOptions=''):
+    """
+    Create a project for the fake simulator with group 'bench' running
+    numTests seeds of one test, and a group.cfg 'many' listing numTests tests
+    """
+    cfgDir = os.path.join(prjHome, 'bin', 'fake_cfg')
+    testDir = os.path.join(prjHome, 'testcases', 'bench_test')
+    for path in (cfgDir, testDir):
+        if not os.path.exists(path):
+            os.makedirs(path)
+    with open(os.path.join(testDir, 'bench_test.sv'), 'w') as f:
+        f.write('// fake test\n')
+    with open(os.path.join(cfgDir, 'userCli.cfg'), 'w') as f:
+        f.write('[userCli]\n')
+    with open(os.path.join(cfgDir, 'build.cfg'), 'w') as f:
+        f.write('[build]\ndefault_build = bench_build\ncompile_option = -sverilog\nsim_option = +fake_log_lines=100 %s\n'
+                '[[bench_build]]\ncompile_option = -timescale=1ns/1ps\nsim_option = +UVM_VERBOSITY=LOW\n' % simOptions)
+    with open(os.path.join(cfgDir, 'group.cfg'), 'w') as f:
+        f.write('[testgroup]\n[[bench]]\nbuild = bench_build\nargs = -r %i\ntests = bench_test\n' % numTests)
+        f.write('[[many]]\nbuild = bench_build\n')
+        for index in range(numTests):
+            f.write('tests = bench_test -seed %i\n' % (index + 1))
+
+
+def setEnvironment(prjHome, tempRoot):
+    os.environ['YASA_SIMULATOR'] = 'fake'
+    os.environ['PRJ_HOME'] = prjHome
+    os.environ['TEMP_ROOT'] = tempRoot
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def benchScheduler(numTests, numThreads):
+    """
+    Hand out numTests tests to numThreads workers doing no work
+    """
+    from test_runner import TestScheduler
+
+    def run():
+        scheduler = TestScheduler(list(range(numTests)))
+
+        def worker():
+            while True:
+                try:
+                    scheduler.next()
+                except StopIteration:
+                    return
+                scheduler.test_done()
+
+        threads = [threading.Thread(target=worker) for _ in range(numThreads)]
+        for thread in threads:
+            thread.start()
+        scheduler.wait_for_finish()
+        for thread in threads:
+            thread.join()
+    return timed(run)
+
+
+def benchLogCheck(workDir, numLines):
+    """
+    Check a sim.log of numLines lines the way a test run does
+    """
+    import ostools
+    from testCaseSuite import TestRun
+    from Simulator.fakeSimInterface import fakeSimCheck
+    from Simulator import fakeSim
+
+    logFile = os.path.join(workDir, 'bench_sim.log')
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        fakeSim.simulate(['-l', logFile, '+fake_log_lines=%i' % numLines, '+fake_warning_rate=1'])
+
+    def run():
+        checker = fakeSimCheck().clone()
+        follower = ostools.FileFollower(logFile)
+        TestRun._check_lines(checker, follower.read_lines(final=True))
+        follower.close()
+        assert checker.status[0] == 'WARN', checker.status
+    return timed(run)
+
+
+def benchReport(workDir, numTests):
+    """
+    Add numTests results to a report, printing the status after each and the summary
+    """
+    from test_report import TestReport, PASSED, FAILED
+    from color_printer import NO_COLOR_PRINTER
+
+    def run():
+        stdout = sys.stdout
+        with open(os.devnull, 'w') as devnull:
+            sys.stdout = devnull
+            try:
+                report = TestReport(printer=NO_COLOR_PRINTER, filePath=workDir)
+                report.set_expected_num_tests(numTests)
+                for index in range(numTests):
+                    status = {'status': FAILED if index % 100 == 0 else PASSED, 'reasonMsg': ''}
+                    report.add_result('bench__test__%i' % index, status, 1.0, 'sim.log')
+                    report.print_latest_status(total_tests=numTests)
+                report.print_str()
+                report.to_junit_xml_str()
+            finally:
+                sys.stdout = stdout
+    return timed(run)
+
+
+def benchConfig(numTests):
+    """
+    Parse a group.cfg listing numTests tests
+    """
+    from readCfgFile import readGroupCfgFile
+    from globals import defaultGroupFile
+
+    def run():
+        groupCfg = readGroupCfgFile(defaultGroupFile())
+        tests = groupCfg.getTests('many')
+        assert len(tests['many']) == numTests
+    return timed(run)
+
+
+def benchRun(tempRoot, numTests, numThreads):
+    """
+    Run yasaTop.py on the bench group and return its wall time. The fake
+    simulations have no duration, so beyond YASA itself it only includes
+    launching the simulator processes. A run with a failing test aborts
+    the benchmark since its time would not be comparable
+    """
+    command = [sys.executable, os.path.join(YASA_DIR, 'yasaTop.py'),
+               '-g', 'bench', '-p', str(numThreads), '-sim_output', 'null', '-progress', '1']
+    # The compile is not part of the measurement
+    subprocess.check_call(command + ['-co'], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    start = time.perf_counter()
+    subprocess.check_call(command + ['-so'], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure YASA overhead with the fake simulator')
+    parser.add_argument('-n', nargs='+', type=int, default=[1000, 10000, 100000], dest='sizes',
+                        help='number of tests of the micro benchmarks')
+    parser.add_argument('-p', nargs='+', type=int, default=[1, 4, 16, 64, 256], dest='threads',
+                        help='number of threads')
+    parser.add_argument('-run_sizes', nargs='+', type=int, default=[1000],
+                        help='number of tests of the yasaTop.py run benchmark')
+    parser.add_argument('-log_lines', nargs='+', type=int, default=[10000, 100000, 1000000],
+                        help='number of lines of the log check benchmark')
+    parser.add_argument('-only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS,
+                        help='benchmarks to run')
+    parser.add_argument('-json', default=None,
+                        help='write the results to a JSON file')
+    parser.add_argument('-keep', action='store_true', default=False,
+                        help='keep the generated project and work dir')
+    args = parser.parse_args(argv)
+
+    workDir = tempfile.mkdtemp(prefix='yasa_bench_')
+    prjHome = os.path.join(workDir, 'prj')
+    tempRoot = os.path.join(workDir, 'temp')
+    os.makedirs(tempRoot)
+    setEnvironment(prjHome, tempRoot)
+    sys.path.insert(0, YASA_DIR)
+
+    results = []
+
+    def record(benchmark, size, threads, seconds, unit):
+        results.append({'benchmark': benchmark, 'size': size, 'threads': threads,
+                        'seconds': seconds, 'per_%s_us' % unit: seconds / size * 1e6})
+        print('%-10s %10i %8s %10.3f s %10.2f us/%s' % (benchmark, size, threads or '-', seconds,
+                                                       seconds / size * 1e6, unit))
+
+    print('%-10s %10s %8s %12s %13s' % ('benchmark', 'size', 'threads', 'time', 'per item'))
+    try:
+        createProject(prjHome, max(args.sizes + args.run_sizes))
+        if 'scheduler' in args.only:
+            for size in args.sizes:
+                for threads in args.threads:
+                    record('scheduler', size, threads, benchScheduler(size, threads), 'test')
+        if 'log' in args.only:
+            for lines in args.log_lines:
+                record('log', lines, None, benchLogCheck(workDir, lines), 'line')
+        if 'report' in args.only:
+            for size in args.sizes:
+                record('report', size, None, benchReport(workDir, size), 'test')
+        if 'config' in args.only:
+            for size in args.sizes:
+                createProject(prjHome, size)
+                record('config', size, None, benchConfig(size), 'test')
+        if 'run' in args.only:
+            for size in args.run_sizes:
+                createProject(prjHome, size)
+                for threads in args.threads:
+                    record('run', size, threads, benchRun(tempRoot, size, threads), 'test')
+    finally:
+        if args.keep:
+            print('Kept %s' % workDir)
+        else:
+            shutil.rmtree(workDir, ignore_errors=True)
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -132,7 +132,7 @@ def _create_argument_parser(description=None, for_documentation=False):
     argParser.add_argument('-c', '-clean', 
                         dest='clean', 
                         action='store_true', 
-                        help='Remove output build dir')
+                        help='Remove output build dir and compile even when the build is up to date')
 
     argParser.add_argument('-fail-fast', action='store_true',
                         default=False,
@@ -220,6 +220,112 @@ def _create_argument_parser(description=None, for_documentation=False):
                             const=3600,  default=3600,
                             help="set simulation subprocess watchdog timer")
 
+    argParser.add_argument('-timeout_scale',
+                            type=float,
+                            default=3.0,
+                            metavar='K',
+                            dest='timeout_scale',
+                            help=('Kill a simulation after K times the p95 runtime of its latest runs in the '
+                                  'test history, 0 to always use -timeout_cap. A timeout= annotation of the test '
+                                  'in group.cfg, such as "tests = soc_full timeout=3h", takes precedence'))
+
+    argParser.add_argument('-timeout_cap',
+                            type=positive_int,
+                            default=None,
+                            metavar='SECONDS',
+                            dest='timeout_cap',
+                            help=('Longest simulation timeout derived from the test history, also the timeout of '
+                                  'tests without history. Defaults to -sim_timeout'))
+
+    argParser.add_argument('-timeout_signal',
+                            choices=['TERM', 'USR1', 'INT'],
+                            default='TERM',
+                            dest='timeout_signal',
+                            help=('Signal sent to a compile or simulation which runs past its timeout, such that '
+                                  'it can flush its logs and coverage before it is killed'))
+
+    argParser.add_argument('-timeout_grace',
+                            type=float,
+                            default=30.0,
+                            metavar='SECONDS',
+                            dest='timeout_grace',
+                            help=('Kill a compile or simulation which is still running this long after '
+                                  '-timeout_signal was sent, 0 to kill it right away'))
+
+    argParser.add_argument('-abort_on_fatal',
+                            action='store_true',
+                            default=False,
+                            dest='abort_on_fatal',
+                            help='Kill the simulation as soon as a fatal error shows up in sim.log')
+
+    argParser.add_argument('-sim_output',
+                            choices=['null', 'file', 'pipe'],
+                            default='null',
+                            dest='sim_output',
+                            help=('Where simulator stdout/stderr goes when it is not shown in the terminal. '
+                                  '"null" = discarded, "file" = sim.transcript in the testcase dir, '
+                                  '"pipe" = read and discarded by YASA. sim.log is always written by the simulator'))
+
+    argParser.add_argument('-progress',
+                            type=positive_int,
+                            nargs='?',
+                            const=4,
+                            default=None,
+                            metavar='N',
+                            dest='progress',
+                            help=('Show a single progress line redrawn at most N times per second (default 4) '
+                                  'instead of the status of every test. Details are only printed for failures'))
+
+    argParser.add_argument('-schedule',
+                            choices=['lpt', 'fifo'],
+                            default='lpt',
+                            dest='schedule',
+                            help=('Order in which tests are started. "lpt" = longest expected runtime first, '
+                                  'using the test history, "fifo" = group.cfg order'))
+
+    argParser.add_argument('-build_cache',
+                            default=os.environ.get('YASA_BUILD_CACHE'),
+                            metavar='DIR',
+                            dest='build_cache',
+                            help=('Directory of a build cache shared between workspaces, builds with the same '
+                                  'inputs are fetched from it instead of compiled. Also set by YASA_BUILD_CACHE'))
+
+    argParser.add_argument('-build_cache_size',
+                            type=float,
+                            default=50.0,
+                            metavar='GB',
+                            dest='build_cache_size',
+                            help='Evict least recently used builds when the build cache grows beyond this size')
+
+    argParser.add_argument('-build_cache_age',
+                            type=float,
+                            default=14.0,
+                            metavar='DAYS',
+                            dest='build_cache_age',
+                            help='Evict builds from the build cache that were not used for this many days')
+
+    argParser.add_argument('-trace',
+                            default=None,
+                            metavar='FILE',
+                            dest='trace',
+                            help=('Record how long each phase of compiling and simulating takes and write it to FILE '
+                                  'as a Chrome trace (chrome://tracing or ui.perfetto.dev)'))
+
+    argParser.add_argument('-mem_aware',
+                            action='store_true',
+                            default=False,
+                            dest='mem_aware',
+                            help=('Only start a test when the host has enough free memory for it and is not '
+                                  'overloaded. The memory of a test is its peak in the test history or the '
+                                  'mem= annotation of the test in group.cfg, such as "tests = soc_full mem=20G"'))
+
+    argParser.add_argument('-max_load',
+                            type=float,
+                            default=1.0,
+                            metavar='LOAD',
+                            dest='max_load',
+                            help='With -mem_aware, do not start tests while the load average per CPU is above LOAD')
+
     #argParser.add_argument("-export-json",
     #                    default=None,
     #                    help="Export project information to a JSON file.")
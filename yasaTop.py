@@ -19,8 +19,15 @@ import sys
 import traceback
 import logging
 import os
+import signal
 from os.path import exists, abspath, join
-from database import PickledDataBase, DataBase
+import sqlite3
+from database import PickledDataBase, SqliteDataBase
+from test_history import TestHistory
+from admission import AdmissionControl
+from buildCache import buildCache
+from tracing import TRACER
+from globals import defaultWorkDir
 import ostools
 from yasaCli import yasaCli
 from Simulator.simulatorFactory import SIMULATOR_FACTORY
@@ -29,6 +36,7 @@ from testCaseSuite import testcaseSuite
 from color_printer import (COLOR_PRINTER,
                            NO_COLOR_PRINTER)
 from test_runner import TestRunner
+from lsf_batch import LsfBatchRunner
 from test_report import TestReport
 from exceptions import CompileError
 from compileBuild import singleTestCompile, groupTestCompile
@@ -36,6 +44,10 @@ from about import version, doc
 
 LOGGER = logging.getLogger(__name__)
 
+# Format of the records in the project database, increase it on
+# incompatible changes of the records, the database is then cleared
+DATABASE_FORMAT = 1
+
 class yasaTop(object):
     """
     YASA top scripts
@@ -63,8 +75,6 @@ class yasaTop(object):
 
         self._checkArgs(self._args)
 
-        #database = self._create_database()
-
     def _checkArgs(self, args):
         """
         check parsed arguments, in case of input nothing from command line 
@@ -85,27 +95,42 @@ class yasaTop(object):
     def _create_database(self):
         """
         Create a persistent database to store expensive parse results
+        and the test history
 
-        Check for Python version used to create the database is the
-        same as the running python instance or re-create
+        The database is shared by every user and CI job of the project,
+        it is only cleared when it was written in an incompatible format,
+        see DATABASE_FORMAT. When it can not be opened, for example since
+        it stays locked, the run uses an empty database kept in memory
         """
-        project_database_file_name = join(self._output_path, "project_database")
-        create_new = False
+        project_database_file_name = join(defaultWorkDir(), "project_database.db")
         key = b"version"
-        version = str((9, sys.version)).encode()
+        version = str(DATABASE_FORMAT).encode()
         database = None
         try:
-            database = DataBase(project_database_file_name)
-            create_new = (key not in database) or (database[key] != version)
+            database = SqliteDataBase(project_database_file_name)
+            with database.transaction():
+                stored = database[key] if key in database else None
+                if stored is not None and stored != version:
+                    LOGGER.warning("Clearing %s written in format %s", project_database_file_name, stored)
+                    database.clear()
+                if stored != version:
+                    database[key] = version
         except KeyboardInterrupt:
             raise KeyboardInterrupt
-        except:  # pylint: disable=bare-except
+        except sqlite3.OperationalError as err:
+            # Locked or not readable right now, such as on an NFS hiccup
+            LOGGER.warning("Can not open %s (%s), the test history is not used by this run",
+                           project_database_file_name, err)
+            if database is not None:
+                database.close()
+            database = SqliteDataBase(":memory:")
+        except sqlite3.DatabaseError:
+            # The file is not a database at all
             traceback.print_exc()
-            create_new = True
-
-        if create_new:
-            database = DataBase(project_database_file_name, new=True)
-        database[key] = version
+            if database is not None:
+                database.close()
+            database = SqliteDataBase(project_database_file_name, new=True)
+            database[key] = version
 
         return PickledDataBase(database)
 
@@ -144,14 +169,16 @@ class yasaTop(object):
 
         sys.exit(0)
 
-    def _create_tests(self, testWorkDir, simCmd, simulator_if):
+    def _create_tests(self, testWorkDir, simCmd, simulator_if, annotations=None):
         """
         Create all test cases corresponding testsuites
         """
 
+        annotations = annotations or {}
         test_list = TestList()
         for dir in testWorkDir:
-            test_list.add_test(testcaseSuite(dir, simCmd, simulator_if=simulator_if))
+            test_list.add_test(testcaseSuite(dir, simCmd, simulator_if=simulator_if,
+                                             annotations=annotations.get(dir)))
 
         return test_list
 
@@ -163,11 +190,19 @@ class yasaTop(object):
         >>> YASAsim -t sanity1 -co
         """
 
-        if self._args.compOnly:
-            return self._main_compile_only()
+        if self._args.trace is not None:
+            TRACER.enable()
+        ostools.WATCHDOG.soft_signal = getattr(signal, 'SIG' + self._args.timeout_signal)
+        ostools.WATCHDOG.grace = self._args.timeout_grace
+        try:
+            if self._args.compOnly:
+                return self._main_compile_only()
 
-        all_ok = self._main_run(post_run)
-        return all_ok
+            all_ok = self._main_run(post_run)
+            return all_ok
+        finally:
+            if self._args.trace is not None:
+                TRACER.write(self._args.trace)
 
     def _create_simulator_if(self):
         """
@@ -180,7 +215,9 @@ class yasaTop(object):
             "Simulator binary folder can also be set the in YASA_<SIMULATOR_NAME>_PATH environment variable.\n")
             exit(1)
 
-        return self._simulator_class()
+        simulator_if = self._simulator_class()
+        simulator_if.loadSimCheck()
+        return simulator_if
 
     def _main_run(self, post_run):
         """
@@ -190,6 +227,7 @@ class yasaTop(object):
         """
         simulator_if = self._create_simulator_if()
         simulator_if.sim_timeout = self._args.sim_timeout;
+        simulator_if.abort_on_fatal = self._args.abort_on_fatal
 
         if self._args.group:
             compile = groupTestCompile(cli=self._cli, simulator_if=simulator_if)
@@ -197,23 +235,44 @@ class yasaTop(object):
         else:
             compile = singleTestCompile(cli=self._cli, simulator_if=simulator_if)
             compile.prepareEnv()   
-        test_list = self._create_tests(compile._testCaseWorkDir, compile.simCmd(), simulator_if)
+        test_list = self._create_tests(compile._testCaseWorkDir, compile.simCmd(), simulator_if,
+                                       compile.testAnnotations)
         if not self._args.simOnly:
-            self._compile(compile._buildDir, compile.compileCmd(), simulator_if)
+            self._compile_if_needed(compile, simulator_if)
+
+        build = os.path.basename(compile._buildDir)
+        history = TestHistory(self._create_database())
+        if self._args.schedule == 'lpt':
+            test_list.sort_longest_first(lambda test_suite: history.expected_time(build, test_suite.name))
+        self._set_timeouts(test_list, history, build)
 
         start_time = ostools.get_time()
         report = TestReport(printer=self._printer, filePath=compile._buildDir)
 
+        admission = None
+        if self._args.mem_aware:
+            admission = AdmissionControl(lambda test_suite: (test_suite.annotations.get('mem') or
+                                                             history.expected_memory(build, test_suite.name)),
+                                         max_load=self._args.max_load)
+
+        interrupted = False
         try:
-            self._run_test(test_list, report)
+            self._run_test(test_list, report, admission)
         except KeyboardInterrupt:
             print()
             LOGGER.debug("_main: Caught Ctrl-C shutting down")
+            interrupted = True
         finally:
             del test_list
 
         report.set_real_total_time(ostools.get_time() - start_time)
-        report.print_str()
+        with TRACER.span('report summary', 'report'):
+            report.print_str()
+        # Tests killed or never started by Ctrl-C are reported as failed,
+        # they must not count as runs in the history
+        if not interrupted:
+            with TRACER.span('history update', 'report'):
+                history.add_report(build, report)
 
         if post_run is not None:
             post_run(results=Results(simulator_if))
@@ -226,6 +285,24 @@ class yasaTop(object):
 
         return report.all_ok()
 
+    def _set_timeouts(self, test_list, history, build):
+        """
+        Set the simulation timeout of each test, the timeout= annotation
+        of the test in group.cfg or -timeout_scale times its p95 runtime,
+        at most -timeout_cap which defaults to -sim_timeout
+        """
+        cap = self._args.timeout_cap or self._args.sim_timeout
+        for test_suite in test_list:
+            timeout = test_suite.annotations.get('timeout')
+            source = 'timeout= in group.cfg'
+            if timeout is None:
+                if self._args.timeout_scale > 0:
+                    timeout, source = history.timeout(build, test_suite.name, self._args.timeout_scale, cap)
+                else:
+                    source = 'timeout cap'
+                    timeout = cap
+            test_suite.set_timeout(timeout, source)
+
     def _main_compile_only(self):
         """
         Main function when only compiling
@@ -240,7 +317,7 @@ class yasaTop(object):
             compile.prepareEnv()     
         test_list = self._create_tests(compile._testCaseWorkDir, compile.simCmd(), simulator_if)
 
-        self._compile(compile._buildDir, compile.compileCmd(), simulator_if)        
+        self._compile_if_needed(compile, simulator_if)
         return True
 
     def _create_output_path(self, clean):
@@ -256,11 +333,45 @@ class yasaTop(object):
         """
         Compile entire tb
         """
-        simulator_if.compile(buildDir, cmd, self._printer, self._args.comp_timeout)
+        try:
+            with TRACER.span('compile', 'compile'):
+                simulator_if.compile(buildDir, cmd, self._printer, self._args.comp_timeout)
+        finally:
+            TRACER.add_phases(buildDir, 'compile')
 
-    def _run_test(self, test_cases, report):
+    def _compile_if_needed(self, compile, simulator_if):
+        """
+        Compile unless the build is up to date or found in the build cache,
+        use -clean to force compiling
         """
-        Run the test suites and return the report
+        if compile.upToDate:
+            self._printer.write("Build up to date, skipping compile", fg="gi")
+            self._printer.write("\n")
+            print("Build:")
+            print(' '*4 + compile._buildDir + '\n')
+            return
+
+        cache = None
+        if self._args.build_cache:
+            cache = buildCache(self._args.build_cache, self._args.build_cache_size, self._args.build_cache_age)
+            key = compile.buildKey()
+            if cache.fetch(key, compile._buildDir):
+                compile.saveFingerprint()
+                self._printer.write("Build fetched from cache", fg="gi")
+                self._printer.write("\n")
+                print("Build:")
+                print(' '*4 + compile._buildDir + '\n')
+                return
+
+        self._compile(compile._buildDir, compile.compileCmd(), simulator_if)
+        compile.saveFingerprint()
+        if cache is not None:
+            cache.publish(key, compile._buildDir)
+
+    def _run_test(self, test_cases, report, admission=None):
+        """
+        Run the test suites and return the report,
+        admission delays starting tests which would not fit the host
         """
 
         if self._args.verbose:
@@ -270,12 +381,26 @@ class yasaTop(object):
         else:
             verbosity = TestRunner.VERBOSITY_NORMAL
 
-        runner = TestRunner(report,
-                            verbosity=verbosity,
-                            num_threads=self._args.num_threads,
-                            fail_fast=self._args.fail_fast,
-                            dont_catch_exceptions=self._args.dont_catch_exceptions,
-                            no_color=self._args.no_color)
+        options = dict(verbosity=verbosity,
+                       num_threads=self._args.num_threads,
+                       fail_fast=self._args.fail_fast,
+                       dont_catch_exceptions=self._args.dont_catch_exceptions,
+                       no_color=self._args.no_color,
+                       sim_output=self._args.sim_output,
+                       progress=self._args.progress)
+        if self._args.subparsers == 'lsf' and self._args.lsfBatch:
+            lsf_options = []
+            if self._args.lsfQueue:
+                lsf_options += ['-q', self._args.lsfQueue]
+            if self._args.lsfRusage:
+                lsf_options += ['-R', self._args.lsfRusage]
+            runner = LsfBatchRunner(report,
+                                    lsf_options=lsf_options,
+                                    job_name=self._args.lsfJobName or 'yasa',
+                                    batch_size=self._args.lsfBatchSize,
+                                    **options)
+        else:
+            runner = TestRunner(report, admission=admission, **options)
         runner.run(test_cases)
 
 class Results(object):